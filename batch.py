@@ -0,0 +1,352 @@
+import os
+import sys
+import csv
+import json
+import time
+import zipfile
+import argparse
+import itertools
+import numpy as np
+from collections import deque
+from multiprocessing import Pool, shared_memory
+# My own defined modules
+from geometry import Point, Polygon, segment_crossings, split_polygon, sweep_visibility
+from scene import Scene
+from scenefile import SceneFile, load_scene
+
+# Edges of the polygon as seen by a worker process, a view on the shared memory, or the whole Scene
+worker_memory = None
+worker_edges = None
+worker_scene = None
+
+def _attach_polygon(name, shape):
+    global worker_memory, worker_edges
+    worker_memory = shared_memory.SharedMemory(name=name)
+    worker_edges = np.ndarray(shape, dtype=np.float64, buffer=worker_memory.buf)
+
+# Workers given a scene file map its split segments, nothing is copied or sent to them
+def _map_scene(path):
+    global worker_edges
+    worker_edges = load_scene(path).segments
+
+# A Scene comes once to every worker, its edges are already split and its queries cull the hidden obstacles
+def _use_scene(scene):
+    global worker_scene
+    worker_scene = scene
+
+def _visibility_chunk(viewpoints):
+    started = time.perf_counter()
+    results = []
+    times = []
+    for x, y in viewpoints.tolist():
+        point_started = time.perf_counter()
+        if worker_scene is not None:
+            results.append(worker_scene.visibility((x, y)))
+        else:
+            vertices = sweep_visibility(Point(x, y), worker_edges)
+            results.append(np.array(vertices, dtype=np.float64).reshape(-1, 2))
+        times.append(time.perf_counter() - point_started)
+    return os.getpid(), len(viewpoints), time.perf_counter() - started, results, times
+
+# Computes the visibility polygon from every viewpoint of the (M, 2) array against the same polygon (vertices or a Polygon)
+# The edges are cut at the self intersections once and shared with the workers through shared memory,
+# only the viewpoints travel with the tasks
+# Yields one (K, 2) array per viewpoint, in the order of the viewpoints
+# If stats is a dict it gets filled with viewpoints, seconds and throughput (viewpoints per second) for every worker pid
+def batch_visibility(vertices, viewpoints, workers = None, chunk_size = 64, stats = None):
+    viewpoints = np.asarray(viewpoints, dtype=np.float64).reshape(-1, 2)
+    chunks = (viewpoints[start:start + chunk_size] for start in range(0, len(viewpoints), chunk_size))
+    for _, results, _ in batch_visibility_chunks(vertices, chunks, workers, stats):
+        for result in results:
+            yield result
+
+# Like batch_visibility for viewpoints that come as an iterable of (M, 2) chunks, like the readers below give them
+# Yields (viewpoints, results, seconds) for every chunk in order, seconds has the time of every viewpoint
+# At most window chunks (twice the workers by default) are handed out ahead of the results,
+# so the chunks are only read as fast as the workers get through them
+# A SceneFile (see scenefile.py) is mapped by every worker instead of going through shared memory,
+# a Scene (see scene.py) is sent to every worker once when it starts
+def batch_visibility_chunks(vertices, chunks, workers = None, stats = None, window = None):
+    workers = workers if workers else os.cpu_count()
+    window = window if window else 2 * workers
+    memory = None
+    if isinstance(vertices, SceneFile):
+        initializer, initargs = _map_scene, (vertices.path,)
+    elif isinstance(vertices, Scene):
+        initializer, initargs = _use_scene, (vertices,)
+    else:
+        polygon = vertices if isinstance(vertices, Polygon) else Polygon(vertices)
+        edges = split_polygon(polygon, segment_crossings(polygon)).segments
+        memory = shared_memory.SharedMemory(create=True, size=max(edges.nbytes, 1))
+        shared_edges = np.ndarray(edges.shape, dtype=np.float64, buffer=memory.buf)
+        shared_edges[:] = edges
+        initializer, initargs = _attach_polygon, (memory.name, edges.shape)
+
+    try:
+        with Pool(workers, initializer=initializer, initargs=initargs) as pool:
+            pending = deque()
+            chunks = iter(chunks)
+            while True:
+                while len(pending) < window:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    chunk = np.asarray(chunk, dtype=np.float64).reshape(-1, 2)
+                    pending.append((chunk, pool.apply_async(_visibility_chunk, (chunk,))))
+                if not pending:
+                    break
+                chunk, task = pending.popleft()
+                pid, count, seconds, results, times = task.get()
+                if stats is not None:
+                    worker = stats.setdefault(pid, {"viewpoints": 0, "seconds": 0.0, "throughput": 0.0})
+                    worker["viewpoints"] = worker["viewpoints"] + count
+                    worker["seconds"] = worker["seconds"] + seconds
+                    if worker["seconds"] > 0:
+                        worker["throughput"] = worker["viewpoints"] / worker["seconds"]
+                yield chunk, results, times
+    finally:
+        if memory:
+            memory.close()
+            memory.unlink()
+
+# Signed area of the polygon with the given (K, 2) vertices, positive when they go counterclockwise
+def polygon_area(vertices):
+    if len(vertices) < 3:
+        return 0.0
+    x, y = vertices[:, 0], vertices[:, 1]
+    return float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2
+
+# Command line batch runs, no window and no pygame
+#   python batch.py scene.json viewpoints.csv --output results.jsonl --workers 8
+# The scene is a JSON, CSV or NPZ file:
+#   JSON  [[x, y], ...], {"vertices": [[x, y], ...]} or {"boundary": [[x, y], ...], "obstacles": [[[x, y], ...], ...]}
+#   CSV   one x,y vertex per row
+#   NPZ   a "vertices" or "boundary" (N, 2) array, obstacles as one "obstacles" (M, 2) array cut by "obstacle_sizes"
+#   VIS   a scene file written by scenefile.save_scene, the workers map it
+# The viewpoints are read in chunks from CSV (x,y rows), JSON lines ([x, y] per line), NPY or NPZ ("viewpoints" array)
+# files, a JSON file ([[x, y], ...] or {"viewpoints": ...}) is read at once
+# The results go to JSON lines, JSON, CSV or NPZ (only the NPZ writer keeps the results in memory until the end)
+
+def _ring(points):
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+# The polygon to sweep, a scene with obstacles gives the Scene so its split edges and its culling are used
+def read_scene(path):
+    extension = os.path.splitext(path)[1].lower()
+    obstacles = []
+    if extension == ".vis":
+        return load_scene(path)
+    if extension == ".json":
+        with open(path) as file:
+            data = json.load(file)
+        if isinstance(data, dict):
+            boundary = _ring(data["boundary"] if "boundary" in data else data["vertices"])
+            obstacles = [_ring(obstacle) for obstacle in data.get("obstacles", [])]
+        else:
+            boundary = _ring(data)
+    elif extension == ".csv":
+        boundary = next(read_viewpoints(path, 1 << 62), np.empty((0, 2)))
+    elif extension == ".npz":
+        with np.load(path) as data:
+            boundary = _ring(data["boundary"] if "boundary" in data else data["vertices"])
+            if "obstacles" in data:
+                points = _ring(data["obstacles"])
+                obstacles = np.split(points, np.cumsum(data["obstacle_sizes"])[:-1]) if len(points) else []
+    else:
+        raise ValueError("Unknown scene format " + extension)
+    if obstacles:
+        return Scene(boundary, obstacles)
+    return Polygon(boundary)
+
+def _numeric(line):
+    try:
+        [float(value) for value in line.split(",")[:2]]
+        return True
+    except ValueError:
+        return False
+
+def _read_csv(path, chunk_size):
+    with open(path, newline="") as file:
+        lines = (line for line in file if line.strip() and not line.lstrip().startswith("#"))
+        first = next(lines, None)
+        # A header row is skipped
+        pending = [first] if first is not None and _numeric(first) else []
+        while True:
+            block = pending + list(itertools.islice(lines, chunk_size - len(pending)))
+            pending = []
+            if not block:
+                return
+            yield np.loadtxt(block, delimiter=",", ndmin=2)[:, 0:2]
+
+def _read_json_lines(path, chunk_size):
+    with open(path) as file:
+        lines = (line for line in file if line.strip())
+        while True:
+            block = [json.loads(line) for line in itertools.islice(lines, chunk_size)]
+            if not block:
+                return
+            yield _ring(block)
+
+# Rows of the "viewpoints" array read straight from the archive, the array is never loaded as a whole
+def _read_npz(path, chunk_size):
+    with zipfile.ZipFile(path) as archive, archive.open("viewpoints.npy") as file:
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+        if fortran_order:
+            yield from _chunks(np.load(path)["viewpoints"], chunk_size)
+            return
+        row = dtype.itemsize * int(np.prod(shape[1:]))
+        for start in range(0, shape[0], chunk_size):
+            count = min(chunk_size, shape[0] - start)
+            yield _ring(np.frombuffer(file.read(count * row), dtype=dtype))
+
+def _chunks(array, chunk_size):
+    for start in range(0, len(array), chunk_size):
+        yield _ring(array[start:start + chunk_size])
+
+# Chunks of at most chunk_size viewpoints as (M, 2) arrays
+def read_viewpoints(path, chunk_size = 4096):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return _read_csv(path, chunk_size)
+    if extension == ".jsonl":
+        return _read_json_lines(path, chunk_size)
+    if extension == ".npy":
+        return _chunks(np.load(path, mmap_mode="r"), chunk_size)
+    if extension == ".npz":
+        return _read_npz(path, chunk_size)
+    if extension == ".json":
+        with open(path) as file:
+            data = json.load(file)
+        return _chunks(_ring(data["viewpoints"] if isinstance(data, dict) else data), chunk_size)
+    raise ValueError("Unknown viewpoint format " + extension)
+
+# The writers get every result as it comes and are closed at the end, also when the run fails,
+# then the file holds the results written before the failure
+class JsonWriter:
+    def __init__(self, path, lines = True):
+        self.file = open(path, "w")
+        self.lines = lines
+        self.count = 0
+        if not lines:
+            self.file.write("[\n")
+
+    def write(self, index, viewpoint, vertices, area, seconds):
+        record = json.dumps({"index": index, "viewpoint": viewpoint.tolist(), "area": area, "seconds": seconds,
+            "vertices": vertices.tolist()})
+        if not self.lines and self.count:
+            self.file.write(",\n")
+        self.file.write(record if not self.lines else record + "\n")
+        self.count = self.count + 1
+
+    def close(self):
+        if not self.lines:
+            self.file.write("\n]\n")
+        self.file.close()
+
+# One row per viewpoint, the vertices as "x y x y ..." in the last column
+class CsvWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["index", "x", "y", "area", "count", "seconds", "vertices"])
+
+    def write(self, index, viewpoint, vertices, area, seconds):
+        self.writer.writerow([index, repr(float(viewpoint[0])), repr(float(viewpoint[1])), repr(area), len(vertices),
+            repr(seconds), " ".join(repr(value) for value in vertices.ravel().tolist())])
+
+    def close(self):
+        self.file.close()
+
+# Ragged results, the vertices of viewpoint i are points[offsets[i]:offsets[i + 1]]
+class NpzWriter:
+    def __init__(self, path):
+        self.path = path
+        self.viewpoints = []
+        self.points = []
+        self.counts = []
+        self.areas = []
+        self.seconds = []
+
+    def write(self, index, viewpoint, vertices, area, seconds):
+        self.viewpoints.append(viewpoint)
+        self.points.append(vertices)
+        self.counts.append(len(vertices))
+        self.areas.append(area)
+        self.seconds.append(seconds)
+
+    def close(self):
+        np.savez(self.path, viewpoints=_ring(self.viewpoints), points=_ring(np.concatenate(self.points) if self.points else []),
+            offsets=np.concatenate(([0], np.cumsum(self.counts, dtype=np.int64))), areas=np.array(self.areas, dtype=np.float64),
+            seconds=np.array(self.seconds, dtype=np.float64))
+
+def open_writer(path, format = None):
+    format = format if format else os.path.splitext(path)[1].lower().lstrip(".")
+    if format == "jsonl":
+        return JsonWriter(path)
+    if format == "json":
+        return JsonWriter(path, lines=False)
+    if format == "csv":
+        return CsvWriter(path)
+    if format == "npz":
+        return NpzWriter(path)
+    raise ValueError("Unknown output format " + format)
+
+def run(scene, viewpoints, writer, workers = None, chunk_size = 256, read_size = 4096, log = None):
+    started = time.perf_counter()
+    worker_stats = {}
+    count = 0
+    total = 0.0
+    longest = 0.0
+    area = 0.0
+    try:
+        polygon = read_scene(scene)
+        loaded = time.perf_counter()
+        # Reads of read_size viewpoints are cut into tasks of chunk_size
+        chunks = (chunk[start:start + chunk_size] for chunk in read_viewpoints(viewpoints, read_size)
+            for start in range(0, len(chunk), chunk_size))
+        for chunk, results, times in batch_visibility_chunks(polygon, chunks, workers, worker_stats):
+            for viewpoint, vertices, seconds in zip(chunk, results, times):
+                visible_area = polygon_area(vertices)
+                writer.write(count, viewpoint, vertices, visible_area, seconds)
+                count = count + 1
+                total = total + seconds
+                longest = max(longest, seconds)
+                area = area + visible_area
+            if log:
+                log("%d viewpoints %.2fs" % (count, time.perf_counter() - started))
+    finally:
+        writer.close()
+    finished = time.perf_counter()
+    edges = len(polygon.polygon) if isinstance(polygon, Scene) else len(polygon)
+    return {"viewpoints": count, "edges": edges, "load_seconds": loaded - started, "seconds": finished - started,
+        "viewpoints_per_second": count / (finished - loaded) if finished > loaded else 0.0,
+        "mean_seconds": total / count if count else 0.0, "max_seconds": longest, "mean_area": area / count if count else 0.0,
+        "workers": {str(pid): worker for pid, worker in worker_stats.items()}}
+
+def main():
+    parser = argparse.ArgumentParser(description="Visibility polygons of many viewpoints, without a window")
+    parser.add_argument("scene", help="polygon or scene file (JSON, CSV, NPZ or VIS)")
+    parser.add_argument("viewpoints", help="viewpoint file (CSV, JSON, JSON lines, NPY or NPZ)")
+    parser.add_argument("--output", required=True, help="result file, the format comes from the extension")
+    parser.add_argument("--format", choices=["jsonl", "json", "csv", "npz"], help="result format overriding the extension")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, all the cores by default")
+    parser.add_argument("--chunk-size", type=int, default=256, help="viewpoints per task")
+    parser.add_argument("--read-size", type=int, default=4096, help="viewpoints read from the file at once")
+    parser.add_argument("--summary", help="also write the timing summary to this JSON file")
+    parser.add_argument("--quiet", action="store_true")
+    arguments = parser.parse_args()
+
+    log = None if arguments.quiet else lambda message: print(message, file=sys.stderr)
+    summary = run(arguments.scene, arguments.viewpoints, open_writer(arguments.output, arguments.format), arguments.workers,
+        arguments.chunk_size, arguments.read_size, log)
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    if arguments.summary:
+        with open(arguments.summary, "w") as file:
+            json.dump(summary, file, indent=2)
+
+if __name__ == '__main__':
+    main()
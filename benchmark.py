@@ -0,0 +1,259 @@
+import sys
+import json
+import math
+import time
+import argparse
+import platform
+import numpy as np
+# My own defined modules
+from geometry import Point, Polygon, polygon_segments, polygon_intersections, visible_vertices, expand_visible_vertices, \
+    is_visible, sort_points_on_polygon, points_inside_polygon, segment_crossings, split_polygon, sweep_visibility
+from incremental import IncrementalVisibility
+
+# Benchmark of the visibility pipeline on generated polygons
+# Every stage of the pipeline in main.py is timed on its own, the results are written as JSON and can be compared
+# against a saved baseline, a stage that got slower than the tolerance allows is reported as a regression
+#   python benchmark.py --sizes 10 100 1000 --output results.json
+#   python benchmark.py --baseline results.json
+# A dragged viewpoint is timed as well, incremental updates against sweeping again after every move
+
+# The generators give (N, 2) arrays, the size of the shapes grows with the number of vertices
+# so the edges keep about the same length
+
+# x monotone polygon, an upper and a lower chain of random points between the leftmost and the rightmost one
+def random_polygon(size, rng):
+    scale = 100 * math.sqrt(size)
+    xs = np.sort(rng.uniform(0, scale, size))
+    upper = rng.random(size - 2) < 0.5
+    middle = xs[1:-1]
+    top = np.column_stack((middle[upper], rng.uniform(0.05, 1, upper.sum()) * scale / 2))
+    bottom = np.column_stack((middle[~upper], -rng.uniform(0.05, 1, (~upper).sum()) * scale / 2))
+    return np.vstack(([(xs[0], 0)], bottom, [(xs[-1], 0)], top[::-1]))
+
+# Random radius for every angle around the origin, everything is visible from the origin
+def star_polygon(size, rng):
+    scale = 100 * math.sqrt(size)
+    angles = np.sort(rng.uniform(-np.pi, np.pi, size))
+    radii = rng.uniform(0.3, 1, size) * scale
+    return np.column_stack((radii * np.cos(angles), radii * np.sin(angles)))
+
+# A bar with thin teeth on top, the teeth hide each other from most viewpoints
+def comb_polygon(size, rng):
+    teeth = max(1, (size - 2) // 4)
+    width, gap, height = 10.0, 10.0, 40 * math.sqrt(teeth)
+    length = teeth * (width + gap) + gap
+    vertices = [(0, 0), (length, 0)]
+    for tooth in range(teeth - 1, -1, -1):
+        x = gap + tooth * (width + gap)
+        vertices.extend([(x + width, 10), (x + width, 10 + height), (x, 10 + height), (x, 10)])
+    vertices.append((0, 10))
+    return np.array(vertices, dtype=np.float64)
+
+# A thick arm winding around the origin, only a small part of it is visible from any point
+def spiral_polygon(size, rng):
+    half = max(2, size // 2)
+    turns = max(1, half // 100)
+    thickness = 20.0
+    angles = np.linspace(0, 2 * np.pi * turns, half)
+    radii = 50 + 2 * thickness * angles / (2 * np.pi)
+    outer = np.column_stack(((radii + thickness) * np.cos(angles), (radii + thickness) * np.sin(angles)))
+    inner = np.column_stack((radii * np.cos(angles), radii * np.sin(angles)))
+    return np.vstack((outer, inner[::-1]))
+
+# Random walk closed back to its start, the edges keep crossing each other
+# Uniform random points would give a quadratic number of crossings
+def scribble_polygon(size, rng):
+    return np.cumsum(rng.normal(0, 100, (size, 2)), axis=0)
+
+generators = {"random": random_polygon, "star": star_polygon, "comb": comb_polygon, "spiral": spiral_polygon, "scribble": scribble_polygon}
+
+# Random viewpoints inside the polygon, fewer if the polygon covers little of its bounding box
+def inside_points(vertices, count, rng):
+    lower, upper = vertices.min(axis=0), vertices.max(axis=0)
+    polygon = Polygon(vertices)
+    found = np.empty((0, 2))
+    for _ in range(16):
+        candidates = rng.uniform(lower, upper, (max(256, 8 * count), 2))
+        found = np.vstack((found, candidates[points_inside_polygon(candidates, polygon)]))
+        if len(found) >= count:
+            break
+    return found[:count]
+
+# Best of the repeats, the first value returned by the function is kept
+def measure(function, repeat):
+    best = math.inf
+    value = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = function()
+        best = min(best, time.perf_counter() - started)
+    return best, value
+
+# Times every stage for one polygon, the seconds of the viewpoint stages are summed over the viewpoints
+# The pipeline of visibility_polygon is timed stage by stage, the sweep needs the edges cut at the crossings
+# The stages of main.py grow at least quadratically with the size, above legacy_limit vertices they are left out
+def benchmark_polygon(vertices, viewpoints, repeat = 3, legacy_limit = 300):
+    stages = {}
+    polygon = Polygon(vertices)
+    stages["segment_crossings"], crossings = measure(lambda: segment_crossings(polygon), repeat)
+    stages["split_polygon"], split = measure(lambda: split_polygon(polygon, crossings), repeat)
+    for center in viewpoints.tolist():
+        seconds, _ = measure(lambda: sweep_visibility(center, split), repeat)
+        stages["sweep_visibility"] = stages.get("sweep_visibility", 0.0) + seconds
+    if len(vertices) > legacy_limit:
+        return stages
+
+    polygon_edges = polygon_segments(vertices)
+    polygon_vertices = [segment.point1 for segment in polygon_edges]
+    stages["polygon_intersections"], intersection_points = measure(lambda: polygon_intersections(polygon_edges), repeat)
+    for x, y in viewpoints.tolist():
+        point = Point(x, y)
+        timings = {}
+        timings["visible_vertices"], vertices = measure(lambda: visible_vertices(point, polygon_vertices, polygon_edges), repeat)
+        timings["expand_visible_vertices"], vertices = measure(
+            lambda: expand_visible_vertices(point, vertices, polygon_edges, polygon_vertices), repeat)
+        timings["is_visible"], visible_points = measure(lambda: [intersection for intersection in intersection_points
+            if is_visible(point, intersection, polygon_edges, polygon_vertices)], repeat)
+        vertices = list(set(Point(int(round(vertex.x)), int(round(vertex.y))) for vertex in vertices + visible_points))
+        timings["sort_points_on_polygon"], _ = measure(lambda: sort_points_on_polygon(vertices, polygon_vertices), repeat)
+        for stage, seconds in timings.items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+    return stages
+
+# Viewpoints moving by step in straight runs from the start, a run turns to a random direction where it would leave the polygon
+def drag_path(vertices, start, step, moves, rng):
+    polygon = Polygon(vertices)
+    path = [np.asarray(start, dtype=np.float64)]
+    direction = None
+    for _ in range(100 * moves):
+        if len(path) > moves:
+            break
+        if direction is None:
+            angle = rng.uniform(-np.pi, np.pi)
+            direction = np.array([math.cos(angle), math.sin(angle)])
+        following = path[-1] + step * direction
+        if points_inside_polygon(following[None], polygon)[0]:
+            path.append(following)
+        else:
+            direction = None
+    return np.array(path)
+
+# Seconds per move of a viewpoint dragged by step, for IncrementalVisibility and for sweeping the split polygon
+# again every move, with the mean fraction of the events the incremental updates swept again
+# The first update of the incremental state sweeps everything and is not timed
+def benchmark_drag(vertices, start, step, moves = 20, repeat = 3, rng = None):
+    rng = rng if rng else np.random.default_rng(0)
+    polygon = Polygon(vertices)
+    split = split_polygon(polygon, segment_crossings(polygon))
+    path = drag_path(vertices, start, step, moves, rng).tolist()
+    moves = len(path) - 1
+    if moves == 0:
+        return None, None, None
+
+    def sweep_path():
+        for center in path[1:]:
+            sweep_visibility(center, split)
+    sweep_seconds, _ = measure(sweep_path, repeat)
+
+    incremental = IncrementalVisibility(polygon)
+    incremental_seconds = math.inf
+    for _ in range(repeat):
+        incremental.reset()
+        incremental.update(path[0])
+        swept = 0
+        started = time.perf_counter()
+        for center in path[1:]:
+            incremental.update(center)
+            swept = swept + incremental.swept_events
+        incremental_seconds = min(incremental_seconds, time.perf_counter() - started)
+    return sweep_seconds / moves, incremental_seconds / moves, swept / (moves * 2 * max(len(split), 1))
+
+def run(shapes, sizes, viewpoints = 4, repeat = 3, legacy_limit = 300, seed = 0, log = None, drag_steps = (), drag_limit = 10000):
+    results = {}
+    for shape in shapes:
+        for size in sizes:
+            rng = np.random.default_rng(seed)
+            vertices = generators[shape](size, rng)
+            points = inside_points(vertices, viewpoints, rng)
+            started = time.perf_counter()
+            stages = benchmark_polygon(vertices, points, repeat, legacy_limit)
+            key = shape + "/" + str(size)
+            results[key] = {"shape": shape, "vertices": len(vertices), "viewpoints": len(points), "stages": stages}
+            if len(points) and len(vertices) <= drag_limit:
+                swept = {}
+                for step in drag_steps:
+                    sweep_seconds, incremental_seconds, fraction = benchmark_drag(vertices, points[0], step, repeat=repeat, rng=rng)
+                    if sweep_seconds is None:
+                        continue
+                    stages["drag_sweep/%g" % step] = sweep_seconds
+                    stages["drag_incremental/%g" % step] = incremental_seconds
+                    swept["%g" % step] = fraction
+                results[key]["drag_swept"] = swept
+            if log:
+                log("%-16s %4d viewpoints %8.2fs" % (key, len(points), time.perf_counter() - started))
+    return {"meta": {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+        "repeat": repeat, "seed": seed, "created": time.strftime("%Y-%m-%dT%H:%M:%S")}, "results": results}
+
+# Stages slower than the baseline by more than the tolerance (0.25 is 25% slower)
+# Differences under min_seconds are timer noise and never count
+def compare(current, baseline, tolerance = 0.25, min_seconds = 1e-4):
+    regressions = []
+    for key, result in current["results"].items():
+        previous = baseline["results"].get(key)
+        if previous is None or previous["vertices"] != result["vertices"]:
+            continue
+        for stage, seconds in result["stages"].items():
+            before = previous["stages"].get(stage)
+            if before is None:
+                continue
+            if seconds > before * (1 + tolerance) and seconds - before > min_seconds:
+                regressions.append({"case": key, "stage": stage, "baseline": before, "current": seconds,
+                    "ratio": seconds / before if before > 0 else math.inf})
+    return regressions
+
+def print_results(results, baseline = None):
+    for key, result in results["results"].items():
+        previous = baseline["results"].get(key) if baseline else None
+        for stage, seconds in result["stages"].items():
+            line = "%-16s %-24s %10.6fs" % (key, stage, seconds)
+            if previous and stage in previous["stages"] and previous["stages"][stage] > 0:
+                line = line + "  x%.2f" % (seconds / previous["stages"][stage])
+            print(line)
+        for step, fraction in result.get("drag_swept", {}).items():
+            print("%-16s %-24s %10.2f" % (key, "drag_swept/" + step, fraction))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the visibility polygon pipeline")
+    parser.add_argument("--shapes", nargs="+", choices=sorted(generators), default=sorted(generators))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--viewpoints", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--legacy-limit", type=int, default=300, help="largest polygon for the stages of main.py")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--drag-steps", nargs="*", type=float, default=[1.0, 0.1, 0.01], help="move lengths of the dragged viewpoint")
+    parser.add_argument("--drag-limit", type=int, default=10000, help="largest polygon for the drag timings")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    arguments = parser.parse_args()
+
+    results = run(arguments.shapes, arguments.sizes, arguments.viewpoints, arguments.repeat, arguments.legacy_limit,
+        arguments.seed, lambda message: print(message, file=sys.stderr), arguments.drag_steps, arguments.drag_limit)
+    baseline = None
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if baseline:
+        regressions = compare(results, baseline, arguments.tolerance)
+        for regression in regressions:
+            print("REGRESSION %s %s %.6fs -> %.6fs (x%.2f)" % (regression["case"], regression["stage"],
+                regression["baseline"], regression["current"], regression["ratio"]))
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
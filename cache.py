@@ -0,0 +1,120 @@
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+# My own defined modules
+from geometry import Polygon, EdgeGrid, segment_crossings, split_polygon, sweep_visibility
+
+# Content hash of the vertices, edges and origins, any edit of the polygon gives a new fingerprint
+# Polygons sharing a vertex array but joining the vertices differently (holes, obstacles) get different ones
+def polygon_fingerprint(vertices):
+    polygon = vertices if isinstance(vertices, Polygon) else Polygon(vertices)
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (polygon.vertices, polygon.edges, polygon.origins):
+        digest.update(str(array.shape).encode("ascii"))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+# The work that only depends on the polygon, shared by every viewpoint
+class PreparedPolygon:
+    __slots__ = ("fingerprint", "crossings", "polygon", "_edge_index")
+
+    def __init__(self, vertices, fingerprint = None):
+        polygon = vertices if isinstance(vertices, Polygon) else Polygon(vertices)
+        self.fingerprint = fingerprint if fingerprint else polygon_fingerprint(polygon)
+        self.crossings = segment_crossings(polygon)
+        # Edges cut at the self intersections, ready for the sweep
+        self.polygon = split_polygon(polygon, self.crossings)
+        self._edge_index = None
+
+    # Built on first use, not every client needs ray queries
+    @property
+    def edge_index(self):
+        if self._edge_index is None:
+            self._edge_index = EdgeGrid(self.polygon)
+        return self._edge_index
+
+# LRU cache in front of the visibility computation
+# Results are keyed by the polygon fingerprint and the viewpoint snapped to a grid of the given resolution,
+# so viewpoints in the same cell share the result computed for the first of them
+# At most max_entries results and max_bytes of result arrays are kept, prepared polygons are cached
+# separately (max_polygons) and dropping a polygon drops its results too
+class VisibilityCache:
+    def __init__(self, resolution = 1.0, max_entries = 4096, max_bytes = 64 << 20, max_polygons = 8):
+        self.resolution = resolution
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_polygons = max_polygons
+        self.results = OrderedDict()
+        self.polygons = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.polygon_hits = 0
+        self.polygon_misses = 0
+        self.lock = threading.Lock()
+
+    # A PreparedPolygon is used as it is, hashing the polygon again would cost O(n) on every call
+    def prepare(self, vertices):
+        if isinstance(vertices, PreparedPolygon):
+            return vertices
+        fingerprint = polygon_fingerprint(vertices)
+        with self.lock:
+            prepared = self.polygons.get(fingerprint)
+            if prepared is not None:
+                self.polygons.move_to_end(fingerprint)
+                self.polygon_hits = self.polygon_hits + 1
+                return prepared
+            self.polygon_misses = self.polygon_misses + 1
+        prepared = PreparedPolygon(vertices, fingerprint)
+        with self.lock:
+            self.polygons[fingerprint] = prepared
+            while len(self.polygons) > self.max_polygons:
+                evicted, _ = self.polygons.popitem(last=False)
+                self._drop_results(evicted)
+        return prepared
+
+    # Returns the visibility polygon as a (K, 2) array, the array is shared so don't modify it
+    # Callers querying one polygon many times pass the PreparedPolygon from prepare() instead of the vertices
+    def visibility(self, vertices, viewpoint):
+        prepared = self.prepare(vertices)
+        key = (prepared.fingerprint, int(np.floor(viewpoint[0] / self.resolution)), int(np.floor(viewpoint[1] / self.resolution)))
+        with self.lock:
+            result = self.results.get(key)
+            if result is not None:
+                self.results.move_to_end(key)
+                self.hits = self.hits + 1
+                return result
+            self.misses = self.misses + 1
+        result = np.array(sweep_visibility(viewpoint, prepared.polygon), dtype=np.float64).reshape(-1, 2)
+        result.setflags(write=False)
+        with self.lock:
+            if key not in self.results:
+                self.results[key] = result
+                self.bytes = self.bytes + result.nbytes
+                while self.results and (len(self.results) > self.max_entries or self.bytes > self.max_bytes):
+                    _, evicted = self.results.popitem(last=False)
+                    self.bytes = self.bytes - evicted.nbytes
+        return result
+
+    # Forgets a polygon and its results, an edited polygon gets a new fingerprint so this is only needed to free memory early
+    def invalidate(self, vertices):
+        fingerprint = vertices.fingerprint if isinstance(vertices, PreparedPolygon) else polygon_fingerprint(vertices)
+        with self.lock:
+            self.polygons.pop(fingerprint, None)
+            self._drop_results(fingerprint)
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+            self.polygons.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.results), "bytes": self.bytes,
+                "polygon_hits": self.polygon_hits, "polygon_misses": self.polygon_misses, "polygons": len(self.polygons)}
+
+    def _drop_results(self, fingerprint):
+        for key in [key for key in self.results if key[0] == fingerprint]:
+            self.bytes = self.bytes - self.results.pop(key).nbytes
@@ -1,8 +1,10 @@
+# The geometry core only needs numpy, it never imports pygame so it can run headless
+import math
 import numpy as np
-from scipy.interpolate import interp1d
 from collections import namedtuple
-from functools import cmp_to_key
-import copy
+# My own defined modules
+from instrumentation import stats
+from predicates import orient2d, orient2d_array, on_segment
 
 # Some functions will depend that their input should contain this format
 Point = namedtuple("Point", "x y")
@@ -31,23 +33,84 @@ def polygon_points(polygon):
         list.append(Point(line.start_position[0], line.start_position[1]))
     return list
 
+# Closed polygon from an (N, 2) array or a list of points, the last vertex is joined to the first one
+def polygon_segments(vertices):
+    length = len(vertices)
+    points = [Point(float(x), float(y)) for x, y in vertices]
+    return [Segment(points[index], points[(index + 1) % length]) for index in range(length)]
+
+# Polygon kept in contiguous float64 arrays instead of lists of namedtuples
+# vertices (N, 2), edges (E, 2) index pairs into vertices, segments (E, 4) as x1 y1 x2 y2,
+# vectors (E, 2) from the first to the second point of every edge, bounds (E, 4) as min x, min y, max x, max y,
+# origins (E,) the edge of the original polygon every edge was cut from (see split_polygon)
+# Everything taking segments also takes a Polygon and works on these arrays without copying them
+class Polygon:
+    __slots__ = ("vertices", "edges", "segments", "vectors", "bounds", "origins")
+
+    # Without edges the vertices form a closed ring in the given order
+    def __init__(self, vertices, edges = None, origins = None):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float64).reshape(-1, 2)
+        if edges is None:
+            first = np.arange(len(self.vertices), dtype=np.int32)
+            edges = np.stack((first, np.roll(first, -1)), axis=1)
+        self.edges = np.ascontiguousarray(edges, dtype=np.int32).reshape(-1, 2)
+        if origins is None:
+            origins = np.arange(len(self.edges), dtype=np.int32)
+        self.origins = np.ascontiguousarray(origins, dtype=np.int32)
+        self.segments = self.vertices[self.edges].reshape(-1, 4)
+        self.vectors = self.segments[:, 2:4] - self.segments[:, 0:2]
+        self.bounds = np.concatenate((np.minimum(self.segments[:, 0:2], self.segments[:, 2:4]),
+            np.maximum(self.segments[:, 0:2], self.segments[:, 2:4])), axis=1)
+
+    def __len__(self):
+        return len(self.edges)
+
+# Same as split_segments for a Polygon, the crossing points are appended to the vertices
+# and the edges keep their order with every cut edge replaced by its pieces
+# check is called every few thousand edges, it can raise to stop the split (see worker.py)
+def split_polygon(polygon, crossings, check = None):
+    if not crossings:
+        return polygon
+    count = len(polygon.vertices)
+    points = np.array([(point.x, point.y) for _, _, point in crossings], dtype=np.float64)
+    vertices = np.concatenate((polygon.vertices, points))
+    cuts = {}
+    for number, (first_index, second_index, _) in enumerate(crossings):
+        if check is not None and number % 4096 == 0:
+            check()
+        cuts.setdefault(first_index, []).append(count + number)
+        cuts.setdefault(second_index, []).append(count + number)
+
+    edges = []
+    origins = []
+    vectors = polygon.vectors
+    for edge_index, (start, end) in enumerate(polygon.edges.tolist()):
+        if check is not None and edge_index % 4096 == 0:
+            check()
+        origin = polygon.origins[edge_index]
+        if edge_index not in cuts:
+            edges.append((start, end))
+            origins.append(origin)
+            continue
+        # Order the cuts by their parameter along the edge
+        along = (vertices[cuts[edge_index]] - vertices[start]) @ vectors[edge_index]
+        for vertex in [cuts[edge_index][order] for order in np.argsort(along, kind='stable')] + [end]:
+            if not np.array_equal(vertices[start], vertices[vertex]):
+                edges.append((start, vertex))
+                origins.append(origin)
+                start = vertex
+    return Polygon(vertices, edges, origins)
+
 def polygon_lines(polygon):
     list = []
     for line in polygon.sprites():
         list.append(Segment(Point(line.start_position[0], line.start_position[1]), Point(line.end_position[0], line.end_position[1])))
     return list
 
+# Points where the polygon intersects itself, each crossing once (see segment_crossings for the edge pairs)
 def polygon_intersections(segments):
-    points = []
-    for first_segment in segments:
-        for second_segment in segments:
-            if first_segment != second_segment and first_segment.point1 != second_segment.point2 and first_segment.point2 != second_segment.point1:
-                intersection = segment_intersection(first_segment, second_segment)
-                if intersection:
-                    points.append(intersection)
-
-    points_list = [Point(point[0], point[1]) for point in points]
-    return points_list
+    with stats.stage("polygon_intersections"):
+        return [point for _, _, point in segment_crossings(segments)]
 
 def distance(pointA, pointB):
     return np.sqrt((pointA.x - pointB.x) ** 2 + (pointA.y - pointB.y) ** 2)
@@ -70,41 +133,85 @@ def point_identity(point1, point2):
         return True
     return False
 
-# If expanding won't work you might like to change the epsilon here
+# Exact test, the point has to be on the segment itself and not on one of its ends
 def point_on_open_segment(point, segment):
-    epsilon = 0.1
-    if distance(point, segment.point1) + distance(point, segment.point2) - distance(segment.point1, segment.point2) >= epsilon:
-        return False
-    if point_identity(point, segment.point1) or point_identity(point, segment.point2):
-        return False
-    return True
+    return on_segment(point.x, point.y, segment.point1.x, segment.point1.y, segment.point2.x, segment.point2.y, open = True)
 
 def sort_points(points, reference):
     sortable_points = [(point, to_polar([point], reference)[0]) for point in points]
     sorted_points = [point[0] for point in sorted(sortable_points, key=lambda sortable: sortable[1].r)]
     return sorted_points
 
+# Orders the points by their position along the boundary of the polygon, starting at its first vertex
+# Every point goes to its closest edge (see locate_on_polygon) so rounded points are never dropped
 def sort_points_on_polygon(points, polygon_points):
-    sorted = []
-    vertex1 = polygon_points[0]
-    length = len(polygon_points)
-    for index in range(1, length + 1):
-        vertex2 = polygon_points[index % length]
-        to_add_vertices = []
-        for point in points:
-            if point_identity(vertex1, point):
-                 to_add_vertices.append(point)
-            elif point_on_open_segment(point, Segment(vertex1, vertex2)):
-                 to_add_vertices.append(point)
+    if not points:
+        return []
+    coordinates = np.array([(point.x, point.y) for point in points], dtype=np.float64)
+    edges, parameters = locate_on_polygon(coordinates, segments_array(polygon_segments(polygon_points)))
+    return [points[index] for index in order_on_polygon(edges, parameters).tolist()]
 
-        sortable_vertices = [(point, distance(point, vertex1)) for point in to_add_vertices]
-        sortable_vertices.sort(key=lambda sortable: sortable[1])
-        to_add_vertices = [point[0] for point in sortable_vertices]
-        for point in to_add_vertices: sorted.append(point)
+# Closest edge and parameter along it for every point of the (K, 2) array, the point is near start + t * (end - start)
+# A point on a vertex belongs to the edge starting there, with t = 0
+# Every point is tested against the edges of its EdgeGrid cell, an edge outside of the cell is at least as far away
+# as the border of the cell, so only points further from their closest edge than from that border (or in an empty cell)
+# are tested against all edges, chunk by chunk of at most chunk_size point edge pairs
+def locate_on_polygon(points, segments, chunk_size = 1 << 20):
+    edges = segments_array(segments)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    indices = np.zeros(len(points), dtype=np.intp)
+    parameters = np.zeros(len(points), dtype=np.float64)
+    if len(edges) == 0 or len(points) == 0:
+        return indices, parameters
+    starts = edges[:, 0:2]
+    vectors = edges[:, 2:4] - starts
+    lengths = np.einsum('ij,ij->i', vectors, vectors)
+    lengths[lengths == 0] = 1
 
-        vertex1 = vertex2
+    grid = EdgeGrid(edges)
+    cells = np.floor((points - grid.origin) / grid.cell_size).astype(np.intp)
+    corners = grid.origin + cells * grid.cell_size
+    margins = np.minimum((points - corners).min(axis=1), (corners + grid.cell_size - points).min(axis=1))
+    found = np.zeros(len(points), dtype=bool)
+    keys, inverse = np.unique(cells, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1)).tolist()
+    for key, cell in enumerate(keys.tolist()):
+        candidates = grid.cells.get((cell[0], cell[1]))
+        if candidates is None:
+            continue
+        members = order[bounds[key]:bounds[key + 1]]
+        closest, t, distances = _closest_edges(points[members], starts[candidates], vectors[candidates], lengths[candidates])
+        indices[members] = candidates[closest]
+        parameters[members] = t
+        found[members] = distances < margins[members] ** 2
 
-    return sorted
+    rest = np.flatnonzero(~found)
+    step = max(1, chunk_size // len(edges))
+    for first in range(0, len(rest), step):
+        members = rest[first:first + step]
+        indices[members], parameters[members], _ = _closest_edges(points[members], starts, vectors, lengths)
+    # The end of an edge is the start of the next one when they are joined
+    following = (indices + 1) % len(edges)
+    moved = (parameters >= 1) & np.all(edges[indices, 2:4] == edges[following, 0:2], axis=1)
+    indices[moved] = following[moved]
+    parameters[moved] = 0
+    return indices, parameters
+
+# Index into the given edges, parameter and squared distance of the closest edge of every point
+def _closest_edges(points, starts, vectors, lengths):
+    relative = points[:, None, :] - starts[None, :, :]
+    t = np.clip((relative[..., 0] * vectors[:, 0] + relative[..., 1] * vectors[:, 1]) / lengths, 0, 1)
+    offsets = relative - t[..., None] * vectors
+    squared = offsets[..., 0] ** 2 + offsets[..., 1] ** 2
+    closest = np.argmin(squared, axis=1)
+    rows = np.arange(len(points))
+    return closest, t[rows, closest], squared[rows, closest]
+
+# Permutation ordering the locations (edge index, parameter) along the boundary, O(k log k)
+def order_on_polygon(edges, parameters):
+    return np.lexsort((parameters, edges))
 
 # Gives p q r colinear checks if q is on [pr]
 def on_colinear_segment(p, q, r):
@@ -118,12 +225,12 @@ def on_colinear_segment(p, q, r):
 # 1 --> Clockwise
 # 2 --> Counterclockwise
 def orientation(p, q, r):
-    val = (q.y - p.y) * (r.x - q.x) - (q.x - p.x) * (r.y - q.y)
+    sign = orient2d(p.x, p.y, q.x, q.y, r.x, r.y)
 
-    if val == 0:
+    if sign == 0:
         return 0    # colinear
 
-    if val > 0:
+    if sign < 0:
         return 1    #clockwise
     else:
         return 2    # counterclock wise
@@ -157,87 +264,179 @@ def line_equation(line):
     x = np.linalg.solve(variables, result)
     return x
 
+# Packs segments as rows of x1 y1 x2 y2, arrays are passed through untouched
+def segments_array(segments):
+    if isinstance(segments, Polygon):
+        return segments.segments
+    if isinstance(segments, np.ndarray):
+        return segments.reshape(-1, 4)
+    return np.array([(segment.point1.x, segment.point1.y, segment.point2.x, segment.point2.y) for segment in segments], dtype=np.float64).reshape(-1, 4)
+
+# Intersects M query segments with N edges at once, both given as rows of x1 y1 x2 y2
+# Returns a (M, N) hit mask and the (M, N, 2) intersection points, a single query gives (N,) and (N, 2)
+# Solves p + t * r = q + u * s with cross products, so vertical edges need no special care
+# For colinear overlapping segments the point is the first common point along the query
+def batch_segment_intersections(queries, edges):
+    queries = np.asarray(queries, dtype=np.float64)
+    single = queries.ndim == 1
+    queries = queries.reshape(-1, 4)
+    edges = segments_array(edges)
+
+    p = queries[:, None, 0:2]
+    r = queries[:, None, 2:4] - p
+    q = edges[None, :, 0:2]
+    s = edges[None, :, 2:4] - q
+    mask, points = _parametric_intersections(p, r, q, s)
+    if single:
+        return mask[0], points[0]
+    return mask, points
+
+# Same as batch_segment_intersections but intersects the i-th first segment only with the i-th second one
+def pairwise_segment_intersections(first_segments, second_segments):
+    first_segments = segments_array(first_segments)
+    second_segments = segments_array(second_segments)
+    p = first_segments[:, 0:2]
+    q = second_segments[:, 0:2]
+    return _parametric_intersections(p, first_segments[:, 2:4] - p, q, second_segments[:, 2:4] - q)
+
+# Segments p + t * r and q + u * s given as broadcastable arrays with the coordinates on the last axis
+def _parametric_intersections(p, r, q, s):
+    qp = q - p
+    denominator = r[..., 0] * s[..., 1] - r[..., 1] * s[..., 0]
+    qp_cross_s = qp[..., 0] * s[..., 1] - qp[..., 1] * s[..., 0]
+    qp_cross_r = qp[..., 0] * r[..., 1] - qp[..., 1] * r[..., 0]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = qp_cross_s / denominator
+        u = qp_cross_r / denominator
+        mask = (denominator != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+
+        # Parallel segments only meet when they are on the same line and their projections overlap
+        colinear = (denominator == 0) & (qp_cross_r == 0)
+        if colinear.any():
+            r_length = r[..., 0] ** 2 + r[..., 1] ** 2
+            t0 = (qp[..., 0] * r[..., 0] + qp[..., 1] * r[..., 1]) / r_length
+            t1 = t0 + (s[..., 0] * r[..., 0] + s[..., 1] * r[..., 1]) / r_length
+            start = np.maximum(np.minimum(t0, t1), 0)
+            end = np.minimum(np.maximum(t0, t1), 1)
+            overlap = colinear & (r_length > 0) & (start <= end)
+            mask = mask | overlap
+            t = np.where(overlap, start, t)
+
+    points = p + np.where(mask, t, 0)[..., None] * r
+    return mask, points
+
 # Returns the point of intersection of two segments
 def segment_intersection(first_line, second_line):
-    if check_segment_intersection(first_line, second_line):
-        a1, b1 = line_equation(first_line)
-        a2, b2 = line_equation(second_line)
-        variables = np.array([[a1, -1], [a2, -1]])
-        result = np.array([-b1, -b2])
-        x, y = np.linalg.solve(variables, result)
-        return Point(x, y)
+    mask, points = batch_segment_intersections(segments_array([first_line])[0], segments_array([second_line]))
+    if mask[0]:
+        return Point(points[0, 0], points[0, 1])
     return None
 
 def segment_intersections(line, segments):
-    list = []
-    for segment in segments:
-        intersection = segment_intersection(line, segment)
-        if intersection:
-            list.append(intersection)
-    return list
+    mask, points = batch_segment_intersections(segments_array([line])[0], segments)
+    return [Point(x, y) for x, y in points[mask]]
 
 def expand_segment(line, expansion_length):
     line_length = distance(line.point1, line.point2)
     desired_length = line_length + expansion_length
-    a, _ = line_equation(line)
-    slope = np.arctan(a)
-
-    x_addition_mult = 1
-    if line.point2.x < line.point1.x:
-        x_addition_mult = -1
-    if slope > 0:
-        y_addition_mult = 1
-        if line.point2.y < line.point1.y:
-            y_addition_mult = -1
-    else:
-        y_addition_mult = -1
-        if line.point2.y < line.point1.y:
-            y_addition_mult = 1
-
-    x = line.point1.x + x_addition_mult * desired_length * np.cos(slope);
-    y = line.point1.y + y_addition_mult * desired_length * np.sin(slope);
+    x = line.point1.x + (line.point2.x - line.point1.x) * desired_length / line_length
+    y = line.point1.y + (line.point2.y - line.point1.y) * desired_length / line_length
 
     return Segment(Point(line.point1.x, line.point1.y), Point(x, y))
 
-# Will cast a ray with the length of 1000 in both sides to compute the winding number
-# If the size of the screen would be greater than this ray_length should be set
-def inside_polygon(point, lines, ray_length = 1000):
-    winding_number = 0
-    ray = Segment(point, Point(point.x + ray_length, point.y))
-    for line in lines:
-        if check_segment_intersection(ray, line):
-            line_direction = line.point2.y - line.point1.y
-            if line_direction > 0:
-                winding_number = winding_number + 1
-            elif line_direction < 0:
-                winding_number = winding_number - 1
-
-    if winding_number != 0:
-        return True
-    else:
-        return False
+# Nonzero winding rule, a point is inside when the edges wind around it
+def inside_polygon(point, lines):
+    return bool(points_inside_polygon(np.array([[point.x, point.y]]), lines)[0])
+
+def points_inside_polygon(points, lines, rows = None):
+    return winding_numbers(points, lines, rows) != 0
+
+# Winding number of every point of the (M, 2) array, the crossings of the horizontal ray to the right
+# of the point are counted with the sign of the edge direction, the ray has no length limit
+# The edges are bucketed in horizontal rows so a point is only tested against the edges of its row,
+# rows = 1 tests every point against every edge, by default there are as many rows as edges (up to 4096)
+# but never more rows than points, a single point is cheaper to test against all edges at once
+def winding_numbers(points, lines, rows = None, chunk_size = 1 << 22):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    edges = segments_array(lines)
+    winding = np.zeros(len(points), dtype=np.int64)
+    if len(edges) == 0 or len(points) == 0:
+        return winding
+    if rows is None:
+        rows = max(1, min(len(edges), len(points), 4096))
+
+    lower_y = np.minimum(edges[:, 1], edges[:, 3])
+    upper_y = np.maximum(edges[:, 1], edges[:, 3])
+    bottom = float(lower_y.min())
+    height = max((float(upper_y.max()) - bottom) / rows, np.finfo(np.float64).tiny)
+    edge_lower_rows = np.clip(((lower_y - bottom) / height).astype(np.intp), 0, rows - 1)
+    edge_upper_rows = np.clip(((upper_y - bottom) / height).astype(np.intp), 0, rows - 1)
+
+    # Flatten the (edge, row) pairs and group them by row
+    counts = edge_upper_rows - edge_lower_rows + 1
+    edge_ids = np.repeat(np.arange(len(edges)), counts)
+    row_ids = np.repeat(edge_lower_rows, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    order = np.argsort(row_ids, kind='stable')
+    edge_ids = edge_ids[order]
+    edge_starts = np.searchsorted(row_ids[order], np.arange(rows + 1))
+
+    # Points outside of the vertical extent of the polygon have winding number 0
+    point_rows = np.floor((points[:, 1] - bottom) / height)
+    candidates = np.flatnonzero((point_rows >= 0) & (point_rows < rows))
+    point_rows = point_rows[candidates].astype(np.intp)
+    order = np.argsort(point_rows, kind='stable')
+    candidates = candidates[order]
+    point_starts = np.searchsorted(point_rows[order], np.arange(rows + 1))
+
+    for row in range(rows):
+        row_points = candidates[point_starts[row]:point_starts[row + 1]]
+        row_edges = edges[edge_ids[edge_starts[row]:edge_starts[row + 1]]]
+        if len(row_points) == 0 or len(row_edges) == 0:
+            continue
+        step = max(1, chunk_size // len(row_edges))
+        for start in range(0, len(row_points), step):
+            chunk = row_points[start:start + step]
+            winding[chunk] = _winding_numbers(points[chunk], row_edges)
+    return winding
+
+def _winding_numbers(points, edges):
+    x = points[:, 0:1]
+    y = points[:, 1:2]
+    x1, y1, x2, y2 = edges[None, :, 0], edges[None, :, 1], edges[None, :, 2], edges[None, :, 3]
+    # Positive when the point is to the left of the edge
+    is_left = (x2 - x1) * (y - y1) - (x - x1) * (y2 - y1)
+    upward = (y1 <= y) & (y < y2) & (is_left > 0)
+    downward = (y2 <= y) & (y < y1) & (is_left < 0)
+    return upward.sum(axis=1) - downward.sum(axis=1)
 
 def visible_vertices(point, vertices, edges):
     list = []
-    for vertex in vertices:
-        segment = Segment(point, vertex)
-        intersections = segment_intersections(segment, edges)
-        intersections = filter_from_corners(intersections, vertices)
+    if not vertices:
+        return list
+    edges = segments_array(edges)
+    segments = np.array([(point.x, point.y, vertex.x, vertex.y) for vertex in vertices])
+    mask, points = batch_segment_intersections(segments, edges)
+    if stats.enabled:
+        stats.count("edges tested", mask.size)
+        stats.count("intersections found", int(mask.sum()))
+    corners = PointHash(vertices)
+    for index, vertex in enumerate(vertices):
+        intersections = [Point(x, y) for x, y in points[index][mask[index]]]
+        intersections = filter_from_corners(intersections, corners)
         if len(intersections) == 0:
             list.append(vertex)
     return list
 
 
+# Drops the points closer than 0.001 to any of the filters, the filters can be given as a PointHash
+# to build it once for many calls
 def filter_from_corners(points, filters):
-    list = []
-    epsilon = 0.001
-    for point in points:
-        filtered = False
-        for filter in filters:
-            if distance(point, filter) < epsilon:
-                filtered = True
-        if not filtered:
-            list.append(point)
+    if not isinstance(filters, PointHash):
+        filters = PointHash(filters)
+    list = [point for point in points if not filters.near(point)]
+    if stats.enabled:
+        stats.count("points filtered", len(points) - len(list))
     return list
 
 # The first point should be the common point
@@ -254,51 +453,638 @@ def segment_angle(first_segment, second_segment):
     return tetha
 
 
-def expand_visible_vertices(center, vertices, polygon_segments, corners, ray_length = 1000):
+# The rays are followed through the edge index until the first edge that is not a corner,
+# so ray_length only needs to be set to bound the search
+# The edges at every vertex come from the topology table, pass one built once per polygon to share it between viewpoints
+def expand_visible_vertices(center, vertices, polygon_segments, corners, ray_length = np.inf, edge_index = None, topology = None):
     list = []
-    vertices_length = len(vertices)
-    for index in range(vertices_length):
-        vertex = vertices[index]
+    if edge_index is None:
+        edge_index = EdgeGrid(polygon_segments)
+    if topology is None:
+        topology = PolygonTopology(polygon_segments)
+    if not isinstance(corners, PointHash):
+        corners = PointHash(corners)
+    for vertex in vertices:
         list.append(vertex)
-
-        # Get incidence angles
-        current_segment = Segment(vertex, center)
-        # If program is consistent should always find those two segments
-        for segment in polygon_segments:
-            if point_identity(segment.point1, vertex): previous_segment = segment
-            if point_identity(segment.point2, vertex): next_segment = Segment(segment.point2, segment.point1)
-        edges_angle = segment_angle(previous_segment, next_segment)
-        first_angle = segment_angle(current_segment, previous_segment)
-        second_angle = segment_angle(current_segment, next_segment)
-        if edges_angle > np.pi: edges_angle = 2 * np.pi - edges_angle
-        if first_angle > np.pi: first_angle = 2 * np.pi - first_angle
-        if second_angle > np.pi: second_angle = 2 * np.pi - second_angle
-
-        epsilon = 0.05
-        if abs(first_angle + second_angle - edges_angle) < epsilon or \
-            abs(first_angle + second_angle + edges_angle - 2 * np.pi) < epsilon:
+        # Only a ray grazing the vertex goes on into the polygon
+        if not topology.expands(center, topology.vertex_of(vertex)):
             continue
 
-        segment = Segment(center, vertex)
-        expanded_segment = expand_segment(segment, ray_length)
-        intersections = segment_intersections(expanded_segment, polygon_segments)
-        intersections = filter_from_corners(intersections, corners)
-        comparable_points = [(point, distance(point, center)) for point in intersections]
-        intersections = sorted(comparable_points, key=lambda point: point[1])
-        if len(intersections) > 0:
-            closest = intersections[0][0]
-        else:
-            closest = None
+        direction = Vector(vertex.x - center.x, vertex.y - center.y)
+        if stats.enabled:
+            stats.count("rays expanded")
+        hit = edge_index.first_hit(center, direction, distance(center, vertex) + ray_length, corners.mask)
+        if hit:
+            list.append(hit[0])
+    return list
+
+def is_visible(center, point, segments, corners, edge_index = None):
+    if edge_index is None:
+        edge_index = EdgeGrid(segments)
+    if not isinstance(corners, PointHash):
+        corners = PointHash(corners)
+    target = np.array([point.x, point.y])
+    skip = lambda points: corners.mask(points) | (np.hypot(points[:, 0] - target[0], points[:, 1] - target[1]) <= 0.1)
+    if stats.enabled:
+        stats.count("visibility rays")
+    return not edge_index.any_hit(Segment(center, point), skip)
+
+# Spatial hash of points for the epsilon proximity tests, built once and queried in O(1) expected time
+# The cells are epsilon wide so a close point can only be in the 3 x 3 cells around the cell of the query
+class PointHash:
+    def __init__(self, points = (), epsilon = 0.001):
+        self.epsilon = epsilon
+        self.xs = []
+        self.ys = []
+        self.cells = {}
+        for point in points:
+            self.add(point)
 
-        if closest != None:
-            list.append(closest)
+    def __len__(self):
+        return len(self.xs)
+
+    def add(self, point):
+        x, y = float(point[0]), float(point[1])
+        index = len(self.xs)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.cells.setdefault((math.floor(x / self.epsilon), math.floor(y / self.epsilon)), []).append(index)
+        return index
+
+    # Indices of the points closer than epsilon to the point
+    def find(self, point):
+        x, y = float(point[0]), float(point[1])
+        cell_x, cell_y = math.floor(x / self.epsilon), math.floor(y / self.epsilon)
+        limit = self.epsilon * self.epsilon
+        found = []
+        for neighbour_x in (cell_x - 1, cell_x, cell_x + 1):
+            for neighbour_y in (cell_y - 1, cell_y, cell_y + 1):
+                for index in self.cells.get((neighbour_x, neighbour_y), ()):
+                    if (self.xs[index] - x) ** 2 + (self.ys[index] - y) ** 2 < limit:
+                        found.append(index)
+        return found
+
+    def near(self, point):
+        x, y = float(point[0]), float(point[1])
+        cell_x, cell_y = math.floor(x / self.epsilon), math.floor(y / self.epsilon)
+        limit = self.epsilon * self.epsilon
+        for neighbour_x in (cell_x - 1, cell_x, cell_x + 1):
+            for neighbour_y in (cell_y - 1, cell_y, cell_y + 1):
+                for index in self.cells.get((neighbour_x, neighbour_y), ()):
+                    if (self.xs[index] - x) ** 2 + (self.ys[index] - y) ** 2 < limit:
+                        return True
+        return False
+
+    # Mask of the points of the (K, 2) array that are close to any point of the hash
+    def mask(self, points):
+        return np.array([self.near(point) for point in np.asarray(points).reshape(-1, 2).tolist()], dtype=bool)
+
+# Keeps the first of every group of points closer than epsilon to each other, in the order given
+def dedupe_points(points, epsilon = 0.001):
+    kept = PointHash(epsilon=epsilon)
+    list = []
+    for point in points:
+        if not kept.near(point):
+            kept.add(point)
+            list.append(point)
     return list
 
-def is_visible(center, point, segments, corners):
-    intersections = segment_intersections(Segment(center, point), segments)
-    intersections = filter_from_corners(intersections, corners + [point])
-    intersections = [intersection for intersection in intersections if distance(intersection, point) > 0.1]
-    if len(intersections) == 0:
-        return True
-    else:
+# Same for the vertices of a closed ring like a visibility polygon, a point is only dropped when it is within
+# epsilon of the point kept before it and the last points when they are within epsilon of the first one
+# Points that only come close to a point further along the ring are kept, they belong to another part of it
+def dedupe_ring(points, epsilon = 0.001):
+    limit = epsilon * epsilon
+    list = []
+    for point in points:
+        if not list or (point[0] - list[-1][0]) ** 2 + (point[1] - list[-1][1]) ** 2 >= limit:
+            list.append(point)
+    while len(list) > 1 and (list[-1][0] - list[0][0]) ** 2 + (list[-1][1] - list[0][1]) ** 2 < limit:
+        list.pop()
+    return list
+
+# Vertex to incident edges table of a polygon given by its segments, built once and shared by every viewpoint
+# Endpoints closer than epsilon are the same vertex, outgoing and incoming hold the edge starting and ending
+# at every vertex (-1 when there is none)
+class PolygonTopology:
+    def __init__(self, segments, epsilon = 0.001):
+        edges = segments_array(segments)
+        self.points = PointHash(epsilon=epsilon)
+        outgoing = []
+        incoming = []
+        for edge, (start_x, start_y, end_x, end_y) in enumerate(edges.tolist()):
+            for point, table in (((start_x, start_y), outgoing), ((end_x, end_y), incoming)):
+                vertex = self.vertex_of(point)
+                if vertex is None:
+                    vertex = self.points.add(point)
+                    outgoing.append(-1)
+                    incoming.append(-1)
+                table[vertex] = edge
+        self.outgoing = np.array(outgoing, dtype=np.intp)
+        self.incoming = np.array(incoming, dtype=np.intp)
+        self.vertices = np.column_stack((self.points.xs, self.points.ys)).reshape(-1, 2)
+
+        # The other end of the outgoing and of the incoming edge of every vertex, the vertex itself where an edge is missing
+        connected = (self.outgoing >= 0) & (self.incoming >= 0)
+        forward_ends = np.where(connected[:, None], edges[self.outgoing, 2:4], self.vertices)
+        backward_ends = np.where(connected[:, None], edges[self.incoming, 0:2], self.vertices)
+        self._forward_ends = forward_ends.tolist()
+        self._backward_ends = backward_ends.tolist()
+        self._connected = connected.tolist()
+
+    # Index of the vertex at the point, None if the polygon has no vertex there
+    def vertex_of(self, point):
+        found = self.points.find(point)
+        return min(found) if found else None
+
+    # True when the ray from the center through the vertex grazes it, both edges of the vertex are strictly on the
+    # same side of the ray so the ray goes on past the vertex, an edge along the ray blocks it
+    def expands(self, center, vertex):
+        if vertex is None or not self._connected[vertex]:
+            return False
+        x, y = self.points.xs[vertex], self.points.ys[vertex]
+        forward_x, forward_y = self._forward_ends[vertex]
+        backward_x, backward_y = self._backward_ends[vertex]
+        forward_side = orient2d(center[0], center[1], x, y, forward_x, forward_y)
+        return forward_side != 0 and forward_side == orient2d(center[0], center[1], x, y, backward_x, backward_y)
+
+# Cells about as large as an average edge keep the number of cells per edge constant
+def _grid_cell_size(lower, upper):
+    extent = max(float(np.max(upper - lower.min(axis=0))), 1.0)
+    return max(float(np.mean(np.max(upper - lower, axis=1))), extent / (4 * np.sqrt(len(lower))))
+
+# Uniform grid over the edges for ray and segment queries, build it once per polygon
+# Rays walk the cells in order (Amanatides & Woo) so the queries stop at the first cell with a hit
+# cells can give a grid built before for the same segments and cell_size in CSR form, as (keys (G, 2), starts (G + 1,), edges)
+# with the edges of cell keys[k] at edges[starts[k]:starts[k + 1]], the buckets are then views on these arrays
+# With the origin and the shape of that grid as well nothing is computed from the segments
+class EdgeGrid:
+    def __init__(self, segments, cell_size = None, cells = None, origin = None, shape = None):
+        self.edges = segments_array(segments)
+        self.cells = {}
+        if len(self.edges) == 0:
+            self.origin = np.zeros(2)
+            self.cell_size = 1.0
+            self.shape = (0, 0)
+            return
+        if cells is not None and cell_size and origin is not None and shape is not None:
+            self.origin = np.array([origin[0], origin[1]], dtype=np.float64)
+            self.cell_size = cell_size
+            self.shape = (int(shape[0]), int(shape[1]))
+        else:
+            lower = np.minimum(self.edges[:, 0:2], self.edges[:, 2:4])
+            upper = np.maximum(self.edges[:, 0:2], self.edges[:, 2:4])
+            self.origin = lower.min(axis=0) if origin is None else np.array([origin[0], origin[1]], dtype=np.float64)
+            self.cell_size = cell_size if cell_size else _grid_cell_size(lower, upper)
+            if cells is not None:
+                last = np.floor((upper - self.origin) / self.cell_size).astype(np.intp).max(axis=0)
+                self.shape = (int(last[0]) + 1, int(last[1]) + 1)
+        if cells is not None:
+            keys, starts, indices = cells
+            starts = starts.tolist()
+            self.cells = {(cell_x, cell_y): indices[starts[k]:starts[k + 1]] for k, (cell_x, cell_y) in enumerate(keys.tolist())}
+            return
+        lower_cells = np.floor((lower - self.origin) / self.cell_size).astype(np.intp).tolist()
+        upper_cells = np.floor((upper - self.origin) / self.cell_size).astype(np.intp).tolist()
+        self.shape = (max(cell[0] for cell in upper_cells) + 1, max(cell[1] for cell in upper_cells) + 1)
+
+        buckets = {}
+        for index in range(len(self.edges)):
+            for cell_x in range(lower_cells[index][0], upper_cells[index][0] + 1):
+                for cell_y in range(lower_cells[index][1], upper_cells[index][1] + 1):
+                    buckets.setdefault((cell_x, cell_y), []).append(index)
+        self.cells = {cell: np.array(indices, dtype=np.intp) for cell, indices in buckets.items()}
+
+    # Yields the edges of every cell crossed by origin + t * direction for t in [0, length] and the t where the ray leaves the cell
+    def _traverse(self, origin, direction, length):
+        if not self.cells:
+            return
+        cell_size = self.cell_size
+        upper = self.origin + cell_size * np.array(self.shape)
+        start, end = 0.0, length
+        # Clip the ray to the box of the grid
+        for axis in (0, 1):
+            if direction[axis] == 0:
+                if origin[axis] < self.origin[axis] or origin[axis] > upper[axis]:
+                    return
+                continue
+            first = (self.origin[axis] - origin[axis]) / direction[axis]
+            second = (upper[axis] - origin[axis]) / direction[axis]
+            start = max(start, min(first, second))
+            end = min(end, max(first, second))
+        if start > end:
+            return
+
+        cell = [0, 0]
+        step = [0, 0]
+        next_boundary = [np.inf, np.inf]
+        boundary_delta = [np.inf, np.inf]
+        for axis in (0, 1):
+            position = origin[axis] + start * direction[axis]
+            cell[axis] = min(max(int(np.floor((position - self.origin[axis]) / cell_size)), 0), self.shape[axis] - 1)
+            if direction[axis] > 0:
+                step[axis] = 1
+                next_boundary[axis] = (self.origin[axis] + (cell[axis] + 1) * cell_size - origin[axis]) / direction[axis]
+                boundary_delta[axis] = cell_size / direction[axis]
+            elif direction[axis] < 0:
+                step[axis] = -1
+                next_boundary[axis] = (self.origin[axis] + cell[axis] * cell_size - origin[axis]) / direction[axis]
+                boundary_delta[axis] = -cell_size / direction[axis]
+
+        while True:
+            leave = min(next_boundary[0], next_boundary[1], end)
+            indices = self.cells.get((cell[0], cell[1]))
+            if indices is not None:
+                yield indices, leave
+            if leave >= end:
+                return
+            axis = 0 if next_boundary[0] <= next_boundary[1] else 1
+            cell[axis] = cell[axis] + step[axis]
+            if cell[axis] < 0 or cell[axis] >= self.shape[axis]:
+                return
+            next_boundary[axis] = next_boundary[axis] + boundary_delta[axis]
+
+    # Returns (point, edge index) of the closest hit along the ray within max_distance, None when nothing is hit
+    # skip receives the (K, 2) hit points and returns a mask of the ones to ignore
+    def first_hit(self, origin, direction, max_distance = np.inf, skip = None):
+        origin = np.array([origin[0], origin[1]], dtype=np.float64)
+        direction = np.array([direction[0], direction[1]], dtype=np.float64)
+        norm = np.hypot(direction[0], direction[1])
+        if norm == 0:
+            return None
+        direction = direction / norm
+        # The grid is finite so an unbounded ray can stop where it leaves the grid
+        if not np.isfinite(max_distance):
+            corners = self.origin + self.cell_size * np.array([[0, 0], [self.shape[0], 0], [0, self.shape[1]], self.shape])
+            max_distance = float(np.max(np.hypot(corners[:, 0] - origin[0], corners[:, 1] - origin[1])))
+        ray = np.concatenate((origin, origin + max_distance * direction))
+
+        best = None
+        for indices, leave in self._traverse(origin, direction, max_distance):
+            mask, points = batch_segment_intersections(ray, self.edges[indices])
+            if stats.enabled:
+                stats.count("edges tested", len(indices))
+            if skip is not None and mask.any():
+                mask[mask] = ~skip(points[mask])
+            if mask.any():
+                distances = (points[:, 0] - origin[0]) * direction[0] + (points[:, 1] - origin[1]) * direction[1]
+                distances[~mask] = np.inf
+                closest = int(np.argmin(distances))
+                if best is None or distances[closest] < best[0]:
+                    best = (distances[closest], int(indices[closest]), Point(points[closest, 0], points[closest, 1]))
+            # Edges spanning several cells might be hit beyond this cell, a closer edge could still come later
+            if best is not None and best[0] <= leave:
+                break
+        if best is None:
+            return None
+        return best[2], best[1]
+
+    # True when the segment hits any edge, skip works like in first_hit
+    def any_hit(self, segment, skip = None):
+        origin = np.array([segment.point1.x, segment.point1.y], dtype=np.float64)
+        direction = np.array([segment.point2.x - segment.point1.x, segment.point2.y - segment.point1.y], dtype=np.float64)
+        query = segments_array([segment])[0]
+        for indices, leave in self._traverse(origin, direction, 1.0):
+            mask, points = batch_segment_intersections(query, self.edges[indices])
+            if stats.enabled:
+                stats.count("edges tested", len(indices))
+            if skip is not None and mask.any():
+                mask[mask] = ~skip(points[mask])
+            if mask.any():
+                return True
         return False
+
+# Returns (first index, second index, point) for every pair of edges that cross, adjacent edges are skipped
+# Each crossing is reported once, sorted by the edge indices
+# check is called now and then during the search, it can raise to stop it (see worker.py)
+def segment_crossings(segments, check = None):
+    edges = segments_array(segments)
+    first_indices, second_indices = _candidate_pairs(edges, check)
+    if check is not None:
+        check()
+    first_edges = edges[first_indices]
+    second_edges = edges[second_indices]
+    # Edges sharing a vertex always meet there, that is not a crossing
+    adjacent = np.zeros(len(first_indices), dtype=bool)
+    for first_point in (first_edges[:, 0:2], first_edges[:, 2:4]):
+        for second_point in (second_edges[:, 0:2], second_edges[:, 2:4]):
+            adjacent |= np.all(first_point == second_point, axis=1)
+    mask, points = pairwise_segment_intersections(first_edges, second_edges)
+    mask &= ~adjacent
+    if check is not None:
+        check()
+    if stats.enabled:
+        stats.count("edge pairs tested", len(first_indices))
+        stats.count("intersections found", int(mask.sum()))
+
+    first_indices = first_indices[mask]
+    second_indices = second_indices[mask]
+    order = np.lexsort((second_indices, first_indices))
+    crossings = [(first_index, second_index, Point(x, y)) for first_index, second_index, (x, y) in
+        zip(first_indices[order].tolist(), second_indices[order].tolist(), points[mask][order].tolist())]
+    if check is not None:
+        check()
+    return crossings
+
+# Broad phase of segment_crossings, buckets the bounding boxes of the edges on a uniform grid
+# A pair is only emitted from the cell holding the lower corner of the overlap of the two boxes, so it is emitted once
+def _candidate_pairs(edges, check = None):
+    length = len(edges)
+    if length < 2:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    lower = np.minimum(edges[:, 0:2], edges[:, 2:4])
+    upper = np.maximum(edges[:, 0:2], edges[:, 2:4])
+    cell_size = _grid_cell_size(lower, upper)
+    origin = lower.min(axis=0)
+    # Plain lists are much faster than numpy scalars in the loops below
+    lower_cells = np.floor((lower - origin) / cell_size).astype(np.intp).tolist()
+    upper_cells = np.floor((upper - origin) / cell_size).astype(np.intp).tolist()
+    lower = lower.tolist()
+    upper = upper.tolist()
+
+    buckets = {}
+    for index in range(length):
+        if check is not None and index % 4096 == 0:
+            check()
+        for cell_x in range(lower_cells[index][0], upper_cells[index][0] + 1):
+            for cell_y in range(lower_cells[index][1], upper_cells[index][1] + 1):
+                buckets.setdefault((cell_x, cell_y), []).append(index)
+
+    first_indices = []
+    second_indices = []
+    for number, (cell, indices) in enumerate(buckets.items()):
+        if check is not None and number % 1024 == 0:
+            check()
+        count = len(indices)
+        for i in range(count):
+            first = indices[i]
+            for j in range(i + 1, count):
+                second = indices[j]
+                if lower[first][0] > upper[second][0] or lower[second][0] > upper[first][0] or \
+                    lower[first][1] > upper[second][1] or lower[second][1] > upper[first][1]:
+                    continue
+                corner = (max(lower_cells[first][0], lower_cells[second][0]), max(lower_cells[first][1], lower_cells[second][1]))
+                if corner != cell:
+                    continue
+                first_indices.append(first)
+                second_indices.append(second)
+    return np.array(first_indices, dtype=np.intp), np.array(second_indices, dtype=np.intp)
+
+# Cuts the segments at their crossing points such that the result has no proper crossings anymore
+def split_segments(segments, crossings):
+    cuts = [[] for segment in segments]
+    for first_index, second_index, point in crossings:
+        cuts[first_index].append(point)
+        cuts[second_index].append(point)
+
+    list = []
+    for segment, points in zip(segments, cuts):
+        if not points:
+            list.append(segment)
+            continue
+        points = sorted(points, key=lambda point: distance(point, segment.point1))
+        start = segment.point1
+        for point in points + [segment.point2]:
+            if not point_identity(start, point):
+                list.append(Segment(start, point))
+                start = point
+    return list
+
+# Binary heap of the edges crossed by the sweep ray, the closest edge on top
+# Edges don't cross each other so their order stays the same while they are both active,
+# that is why comparing them at any angle where both are active keeps the heap consistent
+# The edges are given relative to the center as plain lists of floats, numpy scalars are too slow here
+class ActiveEdges:
+    def __init__(self, x, y, vector_x, vector_y):
+        self.x = x
+        self.y = y
+        self.vector_x = vector_x
+        self.vector_y = vector_y
+        self.heap = []
+        self.position = {}
+        self.set_angle(0)
+
+    def set_angle(self, angle):
+        self.cos = math.cos(angle)
+        self.sin = math.sin(angle)
+
+    def top(self):
+        return self.heap[0] if self.heap else None
+
+    # Distance from the center to the line of the edge along the ray of the current angle
+    def distance(self, edge):
+        denominator = self.cos * self.vector_y[edge] - self.sin * self.vector_x[edge]
+        if denominator == 0:
+            return math.hypot(self.x[edge], self.y[edge])
+        return (self.x[edge] * self.vector_y[edge] - self.y[edge] * self.vector_x[edge]) / denominator
+
+    def _swap(self, i, j):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.position[heap[i]] = i
+        self.position[heap[j]] = j
+
+    def _sift_up(self, index):
+        heap = self.heap
+        while index > 0:
+            parent = (index - 1) // 2
+            if not self.distance(heap[index]) < self.distance(heap[parent]):
+                break
+            self._swap(index, parent)
+            index = parent
+
+    def _sift_down(self, index):
+        heap = self.heap
+        length = len(heap)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < length and self.distance(heap[child]) < self.distance(heap[smallest]):
+                    smallest = child
+            if smallest == index:
+                break
+            self._swap(index, smallest)
+            index = smallest
+
+    def insert(self, edge, angle):
+        self.set_angle(angle)
+        self.heap.append(edge)
+        self.position[edge] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def remove(self, edge, angle):
+        if edge not in self.position:
+            return
+        self.set_angle(angle)
+        index = self.position.pop(edge)
+        last = self.heap.pop()
+        if index < len(self.heap):
+            self.heap[index] = last
+            self.position[last] = index
+            self._sift_up(index)
+            self._sift_down(self.position[last])
+
+# Rotational sweep around the center over segments that don't cross each other (see split_segments and split_polygon)
+# The segments can be a list of Segment, an (N, 4) array or a Polygon
+# Returns the vertices of the visibility polygon ordered by angle in O(n log n)
+def sweep_visibility(center, segments):
+    return _sweep_visibility(center, segments)[0]
+
+# Same as sweep_visibility, the points come as a (K, 2) array together with the edge each of them lies on
+# and its parameter t along that edge, point = start + t * (end - start)
+# Sorting the locations with order_on_polygon orders the points along the boundary instead of by angle
+def sweep_visibility_locations(center, segments):
+    edges = segments_array(segments)
+    list, indices = _sweep_visibility(center, edges)
+    points = np.array(list, dtype=np.float64).reshape(-1, 2)
+    indices = np.array(indices, dtype=np.intp)
+    starts = edges[indices, 0:2]
+    vectors = edges[indices, 2:4] - starts
+    lengths = np.einsum('ij,ij->i', vectors, vectors)
+    lengths[lengths == 0] = 1
+    parameters = np.clip(np.einsum('ij,ij->i', points - starts, vectors) / lengths, 0, 1)
+    return points, indices, parameters
+
+# The sweep behind sweep_visibility, returns the points and the index of the edge of every point
+def _sweep_visibility(center, segments):
+    list = []
+    edge_indices = []
+    for point, edge in iter_sweep_visibility(center, segments):
+        list.append(point)
+        edge_indices.append(edge)
+    return list, edge_indices
+
+# Streaming form of the sweep, yields (point, edge index) pairs ordered by angle while the sweep goes on
+# A vertex is yielded once the next one is found, only then it is sure the vertex is not the last one
+# closing the polygon back onto the first, apart from the output the memory is the one of the sweep itself
+def iter_sweep_visibility(center, segments):
+    epsilon = 1e-9
+    full_turn = 2 * np.pi
+    center_x, center_y = float(center[0]), float(center[1])
+    edges = segments_array(segments)
+    if len(edges) == 0:
+        return
+    relative = edges - np.array([center_x, center_y, center_x, center_y])
+    # Exact side of the center, the float cross product can get the sign of nearly colinear edges wrong
+    cross_product = orient2d_array((center_x, center_y), edges[:, 0:2], edges[:, 2:4])
+    # Orient the edges counterclockwise around the center, the angle grows from the start to the end
+    swap = cross_product < 0
+    start_angles = np.where(swap, np.arctan2(relative[:, 3], relative[:, 2]), np.arctan2(relative[:, 1], relative[:, 0]))
+    end_angles = np.where(swap, np.arctan2(relative[:, 1], relative[:, 0]), np.arctan2(relative[:, 3], relative[:, 2]))
+    # Segments colinear with the center can't hide anything
+    usable = cross_product != 0
+    if not usable.any():
+        return
+
+    # Measure every angle from the first event such that the sweep covers [0, 2pi)
+    origin = float(start_angles[usable].min())
+    starts = (start_angles - origin) % full_turn
+    ends = (end_angles - origin) % full_turn
+    starts[starts > full_turn - epsilon] = 0
+    ends[ends > full_turn - epsilon] = 0
+    usable &= (ends - starts) % full_turn >= epsilon
+    indices = np.flatnonzero(usable)
+
+    # Removals are sorted before insertions at the same angle
+    angles = np.concatenate((ends[indices], starts[indices]))
+    kinds = np.concatenate((np.zeros(len(indices), dtype=np.intp), np.ones(len(indices), dtype=np.intp)))
+    events = np.concatenate((indices, indices))
+    order = np.lexsort((kinds, angles))
+    angles, kinds, events = angles[order].tolist(), kinds[order].tolist(), events[order].tolist()
+    initial = indices[starts[indices] > ends[indices]].tolist()
+    if stats.enabled:
+        stats.count("sweep events", len(angles))
+
+    # Group the events that happen at the same angle
+    groups = []
+    group_angles = []
+    for angle, kind, index in zip(angles, kinds, events):
+        if groups and angle - group_angles[-1] < epsilon:
+            groups[-1].append((kind, index))
+        else:
+            groups.append([(kind, index)])
+            group_angles.append(angle)
+    group_angles.append(full_turn)
+
+    active = ActiveEdges(relative[:, 0].tolist(), relative[:, 1].tolist(),
+        (relative[:, 2] - relative[:, 0]).tolist(), (relative[:, 3] - relative[:, 1]).tolist())
+    before_first = origin + (group_angles[-2] + full_turn) / 2
+    for index in initial:
+        active.insert(index, before_first)
+
+    first = pending = None
+    last_x = last_y = None
+    for group_index, group in enumerate(groups):
+        angle = origin + group_angles[group_index]
+        previous_angle = group_angles[group_index - 1] if group_index > 0 else group_angles[-2] - full_turn
+        before = origin + (previous_angle + group_angles[group_index]) / 2
+        after = origin + (group_angles[group_index] + group_angles[group_index + 1]) / 2
+        old_closest = active.top()
+        for kind, index in group:
+            if kind == 0:
+                active.remove(index, before)
+        for kind, index in group:
+            if kind == 1:
+                active.insert(index, after)
+        new_closest = active.top()
+        if old_closest == new_closest:
+            continue
+        active.set_angle(angle)
+        for closest in (old_closest, new_closest):
+            if closest is None:
+                continue
+            length = active.distance(closest)
+            x = center_x + length * active.cos
+            y = center_y + length * active.sin
+            if last_x is None or math.hypot(x - last_x, y - last_y) >= 0.001:
+                if pending is None:
+                    first = Point(x, y)
+                    pending = (first, closest)
+                else:
+                    yield pending
+                    pending = (Point(x, y), closest)
+                last_x, last_y = x, y
+
+    if pending is not None and (pending[0] is first or not point_identity(first, pending[0])):
+        yield pending
+
+# Entry point working on plain arrays, vertices is an (N, 2) array of the polygon in drawing order
+# Returns the vertices of the visibility polygon from the viewpoint as a (K, 2) array ordered by angle
+# A Polygon can be passed instead of the vertices
+def visibility_polygon(vertices, viewpoint):
+    polygon = vertices if isinstance(vertices, Polygon) else Polygon(vertices)
+    with stats.stage("segment_crossings"):
+        crossings = segment_crossings(polygon)
+    with stats.stage("split_polygon"):
+        polygon = split_polygon(polygon, crossings)
+    with stats.stage("sweep_visibility"):
+        vertices = sweep_visibility(viewpoint, polygon)
+    return np.array(vertices, dtype=np.float64).reshape(-1, 2)
+
+# Streaming form of visibility_polygon, yields the vertices as Point ordered by angle as soon as the sweep
+# has them, the crossings are still found before the first one
+# The sweep_visibility stage also holds the time the consumer spends between the vertices,
+# check is handed to the crossing stages that come before the first vertex
+def iter_visibility_polygon(vertices, viewpoint, check = None):
+    polygon = vertices if isinstance(vertices, Polygon) else Polygon(vertices)
+    with stats.stage("segment_crossings"):
+        crossings = segment_crossings(polygon, check)
+    with stats.stage("split_polygon"):
+        polygon = split_polygon(polygon, crossings, check)
+    with stats.stage("sweep_visibility"):
+        for point, _ in iter_sweep_visibility(viewpoint, polygon):
+            yield point
+
+# Like visibility_polygon, also returns for every vertex the edge of the given polygon it lies on
+# and the parameter t along that edge, as (points (K, 2), edges (K,), parameters (K,))
+def visibility_polygon_locations(vertices, viewpoint):
+    original = vertices if isinstance(vertices, Polygon) else Polygon(vertices)
+    polygon = split_polygon(original, segment_crossings(original))
+    points, pieces, _ = sweep_visibility_locations(viewpoint, polygon)
+    # Pieces of a cut edge keep the parameters of the whole edge
+    edges = polygon.origins[pieces].astype(np.intp)
+    starts = original.segments[edges, 0:2]
+    vectors = original.vectors[edges]
+    lengths = np.einsum('ij,ij->i', vectors, vectors)
+    lengths[lengths == 0] = 1
+    parameters = np.clip(np.einsum('ij,ij->i', points - starts, vectors) / lengths, 0, 1)
+    return points, edges, parameters
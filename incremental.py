@@ -0,0 +1,314 @@
+import math
+import numpy as np
+# My own defined modules
+from geometry import Point, Polygon, ActiveEdges, batch_segment_intersections, segment_crossings, split_polygon, sweep_visibility
+from predicates import orient2d_array
+
+# Visibility polygon of a viewpoint that moves in small steps, like while the user drags it
+# The output of the sweep only depends on the angular order of the edge endpoints (the events):
+# edges that don't cross keep their depth order, so the active edges after any event are the same
+# as long as the events come in the same order. The events are cut into segments at anchor events
+# and every segment remembers the active edges at its start (a checkpoint) and what it emitted
+# (the ray event and the edge of every visibility polygon vertex). After a move only the segments
+# whose events changed order are swept again, the others just get their points recomputed
+# When the viewpoint crosses an edge the depth order changes as well and everything is swept again
+# A large move changes the order of most events, repairing would then cost more than one sweep of everything,
+# so once more than repair_limit of the events have to be swept again the whole circle is swept at once
+# Moves nearly as long as the last one that needed this skip the bookkeeping of the segments and just run
+# sweep_visibility, the first clearly shorter move starts keeping it again
+class IncrementalVisibility:
+    def __init__(self, polygon, segment_length = 64, repair_limit = 0.6):
+        polygon = polygon if isinstance(polygon, Polygon) else Polygon(polygon)
+        self.polygon = split_polygon(polygon, segment_crossings(polygon))
+        # Event e is the endpoint e % 2 of the edge e // 2
+        self.endpoints = self.polygon.segments.reshape(-1, 2)
+        self.segment_length = segment_length
+        self.repair_limit = repair_limit
+        # Number of events swept again by the last update
+        self.swept_events = 0
+        self.reset()
+
+    # Forgets the previous viewpoint, the next update sweeps everything
+    def reset(self):
+        self.center = None
+        self.order = None
+        # Length of the last move that was too large to repair
+        self.fallback_move = None
+
+    def update(self, center):
+        epsilon = 1e-9
+        full_turn = 2 * np.pi
+        center_x, center_y = float(center[0]), float(center[1])
+        edges = self.polygon.segments
+        if len(edges) == 0:
+            return []
+        move = math.hypot(center_x - self.center[0], center_y - self.center[1]) if self.center is not None else None
+        if move is not None and self.fallback_move is not None and move >= 0.75 * self.fallback_move:
+            self.center = (center_x, center_y)
+            self.order = None
+            self.swept_events = len(self.endpoints)
+            return sweep_visibility(self.center, self.polygon)
+        self.move = move
+        if self.center is not None:
+            crossed, _ = batch_segment_intersections(np.array(self.center + (center_x, center_y)), edges)
+            if crossed.any():
+                self.order = None
+        self.center = (center_x, center_y)
+        relative = edges - np.array([center_x, center_y, center_x, center_y])
+        # Exact side of the viewpoint like in the sweep, so both agree on nearly colinear edges
+        cross_product = orient2d_array((center_x, center_y), edges[:, 0:2], edges[:, 2:4])
+        angles = np.arctan2(self.endpoints[:, 1] - center_y, self.endpoints[:, 0] - center_x)
+        # The counterclockwise sweep inserts an edge at its start and removes it at its end
+        swap = cross_product < 0
+        kinds = np.empty(len(angles), dtype=np.int8)
+        kinds[0::2] = np.where(swap, 0, 1)
+        kinds[1::2] = np.where(swap, 1, 0)
+        starts = np.where(swap, angles[1::2], angles[0::2])
+        ends = np.where(swap, angles[0::2], angles[1::2])
+        # Segments colinear with the center can't hide anything
+        usable = (cross_product != 0) & ((ends - starts) % full_turn >= epsilon)
+        initial = usable & (starts > ends)
+
+        self.angles = angles.tolist()
+        self.kinds = kinds
+        self.usable = usable
+        self.relative = relative
+        # Plain lists for the sweep loop, indexing numpy arrays one element at a time is slow
+        self.usable_list = usable.tolist()
+        self.kinds_list = kinds.tolist()
+        self.active = ActiveEdges(relative[:, 0].tolist(), relative[:, 1].tolist(),
+            (relative[:, 2] - relative[:, 0]).tolist(), (relative[:, 3] - relative[:, 1]).tolist())
+
+        self.swept_events = 0
+        if self.order is None:
+            self._sweep_all(initial)
+        else:
+            self._repair(initial)
+        return self._points()
+
+    def _sweep_all(self, initial):
+        self.order = np.argsort(np.array(self.angles), kind='stable')
+        # Anchors are placed on group boundaries, every segment holds about segment_length events
+        anchors = []
+        position = self.segment_length
+        while position < len(self.order):
+            if self.angles[self.order[position]] - self.angles[self.order[position - 1]] >= 1e-9:
+                anchors.append(int(self.order[position]))
+                position = position + self.segment_length
+            else:
+                position = position + 1
+        self.anchors = anchors
+        self.anchor_flags = np.zeros(len(self.order), dtype=bool)
+        self.anchor_flags[anchors] = True
+        count = len(anchors) + 1
+        self.checkpoints = [None] * count
+        self.programs = [None] * count
+        self.checkpoints[0] = np.flatnonzero(initial).tolist()
+        self.initial = initial
+        self.usable_before = self.usable
+        self.kinds_before = self.kinds
+        self._index_segments()
+        self._sweep(0, count)
+
+    # Segment and rank inside the segment of every event for the current order
+    def _index_segments(self):
+        segments = np.cumsum(self.anchor_flags[self.order])
+        starts = np.searchsorted(segments, np.arange(len(self.anchors) + 1))
+        self.segment_starts = np.append(starts, len(self.order)).tolist()
+        self.segment_of_event = np.empty(len(self.order), dtype=np.intp)
+        self.segment_of_event[self.order] = segments
+        self.rank_of_event = np.empty(len(self.order), dtype=np.intp)
+        self.rank_of_event[self.order] = np.arange(len(self.order)) - starts[segments]
+
+    def _repair(self, initial):
+        previous_segments = self.segment_of_event.copy()
+        previous_ranks = self.rank_of_event.copy()
+        # Timsort only needs linear time on an order that is nearly sorted already
+        self.order = self.order[np.argsort(np.array(self.angles)[self.order], kind='stable')]
+        anchor_positions = np.flatnonzero(self.anchor_flags[self.order])
+        if np.any(self.order[anchor_positions] != self.anchors):
+            # The anchors themselves changed order, the move was too large to repair
+            self._sweep_all(initial)
+            return
+        self._index_segments()
+
+        changed = (self.segment_of_event != previous_segments) | (self.rank_of_event != previous_ranks)
+        edges_changed = (self.usable != self.usable_before) | (self.kinds[0::2] != self.kinds_before[0::2])
+        changed[0::2] |= edges_changed
+        changed[1::2] |= edges_changed
+        dirty = np.zeros(len(self.anchors) + 1, dtype=bool)
+        dirty[self.segment_of_event[changed]] = True
+        dirty[previous_segments[changed]] = True
+        if np.any(initial != self.initial):
+            dirty[0] = True
+            self.checkpoints[0] = np.flatnonzero(initial).tolist()
+        self.initial = initial
+        self.usable_before = self.usable
+        self.kinds_before = self.kinds
+
+        if np.max(np.diff(self.segment_starts)) > 4 * self.segment_length:
+            self._sweep_all(initial)
+            return
+        limit = self.repair_limit * len(self.order)
+        sizes = np.diff(self.segment_starts)
+        if sizes[dirty].sum() > limit:
+            self._fall_back(initial)
+            return
+        self.fallback_move = None
+
+        count = len(dirty)
+        segment = 0
+        while segment < count:
+            if not dirty[segment]:
+                segment = segment + 1
+                continue
+            start = segment
+            while segment < count and dirty[segment]:
+                segment = segment + 1
+            # A group of events at the same angle can't be split over two sweeps
+            while start > 0 and (self._joined(start) or self.checkpoints[start] is None):
+                start = start - 1
+            while segment < count and self._joined(segment):
+                segment = segment + 1
+            active = self._sweep(start, segment)
+            if self.swept_events > limit:
+                self._fall_back(initial)
+                return
+            # If the active edges don't match the next checkpoint the following segment is stale as well
+            while segment < count and (self.checkpoints[segment] is None or sorted(active) != sorted(self.checkpoints[segment])):
+                self.checkpoints[segment] = active
+                start = segment
+                segment = segment + 1
+                while segment < count and self._joined(segment):
+                    segment = segment + 1
+                active = self._sweep(start, segment)
+                if self.swept_events > limit:
+                    self._fall_back(initial)
+                    return
+
+    def _fall_back(self, initial):
+        self.fallback_move = self.move
+        self._sweep_all(initial)
+
+    # True when the first event of the segment has the same angle as the last event of the previous one
+    def _joined(self, segment):
+        position = self.segment_starts[segment]
+        if position == 0 or position >= len(self.order):
+            return False
+        return self.angles[self.order[position]] - self.angles[self.order[position - 1]] < 1e-9
+
+    # Angle of the event at the position, positions outside of the order wrap around the circle
+    def _angle(self, position):
+        length = len(self.order)
+        return self.angles[self.order[position % length]] + 2 * np.pi * (position // length)
+
+    # Sweeps the segments in [first, stop), stores their programs and the checkpoints after the first one
+    # Returns the active edges at the end
+    def _sweep(self, first, stop):
+        epsilon = 1e-9
+        angles = self.angles
+        usable = self.usable_list
+        kinds = self.kinds_list
+        active = self.active
+        start = self.segment_starts[first]
+        stop_position = self.segment_starts[stop]
+        self.swept_events = self.swept_events + stop_position - start
+        # The events swept, with the one after them for the angle following the last group
+        order = self.order[start:stop_position].tolist()
+        next_angle = self._angle(stop_position)
+
+        # Rebuild the heap from the checkpoint just before the first event, edges sorted by distance are a valid heap
+        previous_angle = self._angle(start - 1)
+        before = (previous_angle + self._angle(start)) / 2
+        edges = np.array(self.checkpoints[first], dtype=np.intp)
+        heap = edges[np.argsort(self._distances(edges, before), kind='stable')].tolist()
+        active.heap = heap
+        active.position = {edge: index for index, edge in enumerate(heap)}
+        active.set_angle(before)
+
+        segment = first
+        programs = {segment: []}
+        program = programs[segment]
+        position = 0
+        length = len(order)
+        while position < length:
+            while segment + 1 < stop and start + position >= self.segment_starts[segment + 1]:
+                segment = segment + 1
+                # A group that runs over the anchor leaves no valid checkpoint, sweeps can't start there
+                self.checkpoints[segment] = list(active.position) if start + position == self.segment_starts[segment] else None
+                programs[segment] = []
+                program = programs[segment]
+            # Collect the group of events at this angle
+            event = order[position]
+            angle = angles[event]
+            group = [event]
+            position = position + 1
+            while position < length:
+                next_event = order[position]
+                if angles[next_event] - angle >= epsilon:
+                    break
+                group.append(next_event)
+                position = position + 1
+            last_angle = angles[group[-1]]
+            group = [event for event in group if usable[event >> 1]]
+            if not group:
+                previous_angle = last_angle
+                continue
+
+            old_closest = active.top()
+            before = (previous_angle + angle) / 2
+            after = (angle + (angles[order[position]] if position < length else next_angle)) / 2
+            previous_angle = last_angle
+            for event in group:
+                if kinds[event] == 0:
+                    active.remove(event >> 1, before)
+            for event in group:
+                if kinds[event] == 1:
+                    active.insert(event >> 1, after)
+            new_closest = active.top()
+            if old_closest != new_closest:
+                for closest in (old_closest, new_closest):
+                    if closest is not None:
+                        program.append(group[0])
+                        program.append(closest)
+        # Every program is kept as an (K, 2) array of ray event and edge
+        for segment, program in programs.items():
+            self.programs[segment] = np.array(program, dtype=np.intp).reshape(-1, 2)
+        return list(active.position)
+
+    # ActiveEdges.distance for many edges at once
+    def _distances(self, edges, angle):
+        relative = self.relative[edges]
+        vector_x = relative[:, 2] - relative[:, 0]
+        vector_y = relative[:, 3] - relative[:, 1]
+        cos, sin = math.cos(angle), math.sin(angle)
+        denominator = cos * vector_y - sin * vector_x
+        numerator = relative[:, 0] * vector_y - relative[:, 1] * vector_x
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denominator != 0, numerator / denominator, np.hypot(relative[:, 0], relative[:, 1]))
+
+    # Intersects the ray through the event of every emission with its edge at the current center
+    def _points(self):
+        program = np.concatenate(self.programs)
+        if len(program) == 0:
+            return []
+        events, edges = program[:, 0], program[:, 1]
+        center = np.array(self.center)
+        directions = self.endpoints[events] - center
+        starts = self.polygon.segments[edges, 0:2] - center
+        vectors = self.polygon.vectors[edges]
+        denominator = directions[:, 0] * vectors[:, 1] - directions[:, 1] * vectors[:, 0]
+        numerator = starts[:, 0] * vectors[:, 1] - starts[:, 1] * vectors[:, 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(denominator != 0, numerator / denominator,
+                np.hypot(starts[:, 0], starts[:, 1]) / np.hypot(directions[:, 0], directions[:, 1]))
+        coordinates = center + scale[:, None] * directions
+
+        # Drop the points repeated by consecutive emissions, like a visible vertex between its two edges
+        steps = np.diff(coordinates, axis=0)
+        keep = np.ones(len(coordinates), dtype=bool)
+        keep[1:] = np.hypot(steps[:, 0], steps[:, 1]) >= 0.001
+        coordinates = coordinates[keep]
+        if len(coordinates) > 1 and np.hypot(*(coordinates[0] - coordinates[-1])) < 0.001:
+            coordinates = coordinates[:-1]
+        return list(map(Point._make, coordinates.tolist()))
@@ -0,0 +1,125 @@
+import sys
+import json
+import time
+import threading
+
+# Stage timings and counters of the visibility pipeline, switched on and off at runtime
+# Everything goes through the shared stats object below:
+#   stats.enable()
+#   with stats.stage("sweep"): ...
+#   if stats.enabled: stats.count("rays expanded", len(rays))
+#   stats.snapshot()
+# Switched off, a stage costs one method call and counters are skipped by the enabled check at the call site
+
+# Returned by stage() while switched off, entering and leaving it does nothing
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+_no_stage = _NoStage()
+
+class _Stage:
+    __slots__ = ("stats", "name", "started")
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.stats.add_time(self.name, time.perf_counter() - self.started)
+        return False
+
+class PipelineStats:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        # Stage name -> [calls, total seconds, max seconds]
+        self.timings = {}
+        self.counters = {}
+        self.dumper = None
+        self.dump_stop = None
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    # Context manager timing the block under the stage name, nested stages are timed on their own
+    def stage(self, name):
+        if not self.enabled:
+            return _no_stage
+        return _Stage(self, name)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                self.timings[name] = [1, seconds, seconds]
+            else:
+                timing[0] = timing[0] + 1
+                timing[1] = timing[1] + seconds
+                timing[2] = max(timing[2], seconds)
+
+    def count(self, name, value = 1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        with self.lock:
+            self.timings = {}
+            self.counters = {}
+
+    # Plain dict copy of everything recorded so far, safe to keep or serialize
+    def snapshot(self):
+        with self.lock:
+            stages = {name: {"calls": calls, "seconds": seconds, "max_seconds": longest, "mean_seconds": seconds / calls}
+                for name, (calls, seconds, longest) in self.timings.items()}
+            return {"time": time.time(), "enabled": self.enabled, "stages": stages, "counters": dict(self.counters)}
+
+    # Writes a snapshot every interval seconds from a background thread until stop_dump
+    # write gets the snapshot dict, by default it is printed as one JSON line on stderr
+    # With reset the numbers of every dump only cover the last interval
+    def start_dump(self, interval = 10.0, write = None, reset = False):
+        self.stop_dump()
+        if write is None:
+            write = lambda snapshot: print(json.dumps(snapshot), file=sys.stderr, flush=True)
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                snapshot = self.snapshot()
+                if reset:
+                    self.reset()
+                write(snapshot)
+
+        self.dump_stop = stop
+        self.dumper = threading.Thread(target=run, name="stats dump", daemon=True)
+        self.dumper.start()
+
+    def stop_dump(self):
+        if self.dumper is not None:
+            self.dump_stop.set()
+            self.dumper.join()
+            self.dumper = None
+            self.dump_stop = None
+
+# Appends every snapshot as a JSON line to the file, to be given as write to start_dump
+def json_lines_writer(path):
+    def write(snapshot):
+        with open(path, "a") as file:
+            file.write(json.dumps(snapshot) + "\n")
+    return write
+
+stats = PipelineStats()
@@ -6,8 +6,10 @@ import time
 # At least I hoped this would draw things better :(
 import pygame.gfxdraw
 # My own defined modules
-from sprites import Text, Line, Circle, Triangle
-from geometry import Point, polygon_lines, polygon_points, polygon_intersections, inside_polygon, visible_vertices, expand_visible_vertices, is_visible, sort_points_on_polygon, sort_points
+from sprites import Text, Line, RubberBandLine, Circle, VisibilityPolygon
+from geometry import Point, polygon_lines, polygon_points, inside_polygon, dedupe_ring
+from instrumentation import stats
+from worker import VisibilityJob
 # Three possible states - draw polygon, pick point, animate, finished
 state = "draw polygon"
 
@@ -17,8 +19,10 @@ all = None
 polygon = None
 # The point of visibility
 point = None
-# Current polygon line that is drawn onto the screen
+# Current polygon line that is drawn onto the screen, it is the rubber band below while drawing
 polygon_line = None
+# The line following the cursor, kept for the whole run so moving it doesn't allocate
+rubber_band = None
 coord_textfield = None
 title_textfield = None
 instructions_textfield = None
@@ -30,7 +34,7 @@ offset_y = 0
 # Should return a line after adding it to the polygon, else None
 # The line is the last polygon line that is drawn, circle is a reference to a circle which should appear when near the first vertex of the polygon to close it
 def draw_polygon(clicked, canceled):
-    global polygon, polygon_line, circle, vertex_circle, coord_textfield, all, state, offset_y
+    global polygon, polygon_line, rubber_band, circle, vertex_circle, coord_textfield, all, state, offset_y
     mouse_position = pygame.mouse.get_pos()
     # If the cursor is not in the canvas area or overlaps coordinate textfield
     overlaps_tf = (mouse_position[0] < (coord_textfield.rect.x + coord_textfield.rect.width) and mouse_position[1] < (coord_textfield.rect.y + coord_textfield.rect.height))
@@ -52,24 +56,32 @@ def draw_polygon(clicked, canceled):
         if polygon_line:
             # If we try to close the polygon
             if distance_from_vertex <= circle_radius:
-                polygon_line.set_position(polygon_line.start_position, first_line.start_position)
-                polygon.add(polygon_line)
-                all.add(polygon_line)
+                line = Line(polygon_line.start_position, first_line.start_position)
+                polygon.add(line)
+                all.add(line)
+                polygon_line.kill()
+                polygon_line = None
                 circle.kill()
                 circle = None
                 state = "pick point"
             else:
-                polygon.add(polygon_line)
-                polygon_line = Line(polygon_line.end_position, mouse_position)
-                all.add(polygon_line)
+                # The rubber band stays with the cursor, the polygon gets a fixed copy of it
+                line = Line(polygon_line.start_position, polygon_line.end_position)
+                polygon.add(line)
+                all.add(line)
+                polygon_line.set_position(polygon_line.end_position, mouse_position)
         # If we should begin to draw the polygon
         else:
-            polygon_line = Line(mouse_position, mouse_position)
+            if rubber_band is None:
+                rubber_band = RubberBandLine(mouse_position, mouse_position)
+            polygon_line = rubber_band
+            polygon_line.set_position(mouse_position, mouse_position)
             all.add(polygon_line)
     # If we didn't click and moved to another frame
     else:
         if polygon_line:
-            polygon_line.set_position(polygon_line.start_position, mouse_position)
+            if polygon_line.end_position != mouse_position:
+                polygon_line.set_position(polygon_line.start_position, mouse_position)
             # If cursor in range and the polygon has at least one line
             if distance_from_vertex <= circle_radius:
                 if circle == None:
@@ -107,29 +119,44 @@ def pick_point(clicked, canceled):
     if canceled:
         state = "draw polygon"
 
+# The visible area is computed by a job on the worker thread, the loop keeps handling events meanwhile
 def stage_one_animation():
-    global polygon, circle, animated_lines, all, potential_expansion_segments
+    global job
     point = Point(circle.center[0], circle.center[1])
-    polygon_edges = polygon_lines(polygon)
-    polygon_vertices = polygon_points(polygon)
-
-    # Compute the points that intersect within the polygon
-    intersection_points =  polygon_intersections(polygon_edges)
-    # Get the vertices that can be viewed from the point
-    vertices = visible_vertices(point, polygon_vertices, polygon_edges)
-    # Try to cast a ray from point to vertex and then check if this can expand visibility
-    vertices = expand_visible_vertices(point, vertices, polygon_edges, polygon_vertices)
-
-    # Filter the intersection points to the ones visible
-    intersection_points = [intersection for intersection in intersection_points if is_visible(point, intersection, polygon_edges, polygon_vertices)]
-    # Add the visible intersection points within the polygon to the vertices of the visibility polygon
-    vertices = vertices + intersection_points
-
-    # Convert those points to drawable ones
-    vertices = [Point(int(round(point.x)), int(round(point.y))) for point in vertices]
-    # Sort the vertices of visibility polygon by traversing the original polygon and eliminate duplicates of points
-    vertices = list(set(vertices))
-    vertices = sort_points_on_polygon(vertices, polygon_vertices)
+    job = VisibilityJob(polygon_points(polygon), point)
+
+# Redraws the fan of the vertices the job found so far, only when it found new ones
+def show_partial_area():
+    global partial_area, partial_count
+    vertices = job.partial()
+    if len(vertices) == partial_count:
+        return
+    partial_count = len(vertices)
+    remove_partial_area()
+    vertices = [Point(int(round(vertex.x)), int(round(vertex.y))) for vertex in vertices]
+    partial_area = VisibilityPolygon(circle.center, vertices, animated = False, closed = False)
+    all.add(partial_area)
+
+def remove_partial_area():
+    global partial_area
+    if partial_area:
+        partial_area.kill()
+        partial_area = None
+
+def finish_stage_one():
+    global job, partial_count
+    point = Point(circle.center[0], circle.center[1])
+    # The vertices of the visibility polygon come out ordered by angle
+    vertices = job.result()
+    job = None
+    partial_count = 0
+    remove_partial_area()
+
+    # Neighbours closer than a pixel would draw as one, drop them before converting the rest to drawable ones
+    # Only neighbours along the ring, vertices of other parts of it can be that close when the point is next to the boundary
+    with stats.stage("dedupe"):
+        vertices = dedupe_ring(vertices.tolist(), 1.0)
+        vertices = [Point(int(round(x)), int(round(y))) for x, y in vertices]
 
     # For debugging
     # size = 5
@@ -141,24 +168,10 @@ def stage_one_animation():
     #     pygame.display.update(dirty)
     #     time.sleep(1)
 
-    last_vertex = None
-    first_vertex = None
-    for vertex in vertices:
-        line = Line(point, vertex)
-        animated_lines.add(line)
-        all.add(line)
-
-        if last_vertex:
-            triangle = Triangle(point, last_vertex, vertex)
-            animated_triangles.add(triangle)
-            all.add(triangle)
-        else:
-            first_vertex = vertex
-        last_vertex = vertex
-    # Draw the last triangle
-    triangle = Triangle(point, last_vertex, first_vertex)
-    animated_triangles.add(triangle)
-    all.add(triangle)
+    # The fan of rays and the visible area are drawn at once onto one surface
+    visible_area = VisibilityPolygon(point, vertices)
+    animated_triangles.add(visible_area)
+    all.add(visible_area)
 
 # I wanted to be able to create multiple animation stages
 def stage_two_animation():
@@ -169,28 +182,31 @@ potential_expansion_segments = None
 # Animation related vars
 animated_lines = pygame.sprite.Group()
 animated_triangles = pygame.sprite.Group()
-animation_stage = 0
-last_animation = None
-# This stage animates gradually the polygon and the visible area
-def animate_polygon(skip):
-    global last_animation, animation_stage, state
-    stage_delay = 1
-    if not last_animation:
-        last_animation = time.time()
-
-    if time.time() - last_animation >= stage_delay:
-        last_animation = time.time()
-        animation_stage = animation_stage + 1
-        if animation_stage == 1:
-            stage_one_animation()
-        elif animation_stage == 2:
-            stage_two_animation()
-            state = "finished"
-
-    if skip:
-        if animation_stage <= 1: stage_one_animation()
-        if animation_stage <= 2: stage_two_animation()
+# The running visibility job, the sprite with what it found so far and how many vertices that was
+job = None
+partial_area = None
+partial_count = 0
+# This stage shows the visible area growing while it is computed, canceling stops the computation
+# and goes back to picking a point
+def animate_polygon(cancel):
+    global job, partial_count, circle, state
+    if job is None:
+        stage_one_animation()
+
+    if cancel:
+        job.cancel()
+        job = None
+        partial_count = 0
+        remove_partial_area()
+        circle.kill()
+        circle = None
+        state = "pick point"
+    elif job.done():
+        finish_stage_one()
+        stage_two_animation()
         state = "finished"
+    else:
+        show_partial_area()
 
 def on_state_changed():
     global title_textfield, instructions_textfield, coord_textfield, state, polygon, polygon_line, circle
@@ -203,8 +219,9 @@ def on_state_changed():
             sprite.kill()
         polygon.empty()
         polygon_line = None
-        circle.kill()
-        circle = None
+        if circle:
+            circle.kill()
+            circle = None
         for triangle in animated_triangles:
             triangle.kill()
         animated_triangles.empty()
@@ -217,13 +234,9 @@ def on_state_changed():
         coord_text = None
     elif state == "animate":
         title_text = "Computing visible area"
-        instruction_text = "Press space to skip"
+        instruction_text = "Press space or escape to cancel"
         coord_text = " "
     elif state == "finished":
-        # Clear old animation data
-        global last_animation, animation_stage
-        last_animation = None
-        animation_stage = 0
         title_text = "This is the visible area"
         instruction_text = "Press R to draw again"
         coord_text = " "
@@ -294,6 +307,9 @@ def main():
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 done = True
+                # The worker thread is joined when the interpreter exits, a running job has to stop first
+                if job is not None:
+                    job.cancel()
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 clicked = True
             if event.type == pygame.KEYDOWN:
@@ -303,6 +319,16 @@ def main():
                     skip = True
                 elif event.key == pygame.K_r and state == "finished":
                     restart = True
+                elif event.key == pygame.K_s:
+                    # Stage timings and counters are dumped on the console while switched on
+                    if stats.enabled:
+                        stats.stop_dump()
+                        stats.disable()
+                        print(stats.snapshot())
+                    else:
+                        stats.reset()
+                        stats.enable()
+                        stats.start_dump(5.0)
 
         # Act accordingly to the current step
         if state == "draw polygon":
@@ -310,7 +336,7 @@ def main():
         elif state == "pick point":
             pick_point(clicked, canceled)
         elif state == "animate":
-            animate_polygon(skip)
+            animate_polygon(skip or canceled)
         elif state == "finished":
             if restart:
                 state = "draw polygon"
@@ -328,6 +354,8 @@ def main():
         pygame.display.update(dirty)
 
 
+    if job is not None:
+        job.cancel()
     pygame.quit()
 
 if __name__ == "__main__":
@@ -0,0 +1,52 @@
+from fractions import Fraction
+import numpy as np
+
+# Geometric predicates that always give the exact answer for float inputs
+# The float determinant is trusted when it is larger than its worst case rounding error (the bound from
+# Shewchuk's adaptive predicates), only the rare ambiguous cases are evaluated again with exact rationals
+# No epsilon is involved, a point is colinear only when it is exactly on the line
+
+machine_epsilon = np.finfo(np.float64).eps / 2
+# Relative error bound of the float orientation determinant
+orientation_bound = (3 + 16 * machine_epsilon) * machine_epsilon
+
+# Sign of the orientation of a b c, 1 for counterclockwise, -1 for clockwise and 0 for colinear
+def orient2d(ax, ay, bx, by, cx, cy):
+    left = (bx - ax) * (cy - ay)
+    right = (by - ay) * (cx - ax)
+    determinant = left - right
+    bound = orientation_bound * (abs(left) + abs(right))
+    if determinant > bound:
+        return 1
+    if -determinant > bound:
+        return -1
+    return _orient2d_exact(ax, ay, bx, by, cx, cy)
+
+def _orient2d_exact(ax, ay, bx, by, cx, cy):
+    ax, ay, bx, by, cx, cy = Fraction(ax), Fraction(ay), Fraction(bx), Fraction(by), Fraction(cx), Fraction(cy)
+    determinant = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    return (determinant > 0) - (determinant < 0)
+
+# orient2d for arrays of points, a b and c are (N, 2) arrays (or a single point broadcast against the others)
+# Returns an (N,) int8 array of signs
+def orient2d_array(a, b, c):
+    a, b, c = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64), np.asarray(c, dtype=np.float64))
+    a, b, c = a.reshape(-1, 2), b.reshape(-1, 2), c.reshape(-1, 2)
+    left = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1])
+    right = (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    determinant = left - right
+    signs = np.sign(determinant).astype(np.int8)
+    ambiguous = np.flatnonzero(np.abs(determinant) <= orientation_bound * (np.abs(left) + np.abs(right)))
+    for index in ambiguous.tolist():
+        signs[index] = _orient2d_exact(a[index, 0], a[index, 1], b[index, 0], b[index, 1], c[index, 0], c[index, 1])
+    return signs
+
+# True when p is on the segment a b, without its endpoints when open is set
+def on_segment(px, py, ax, ay, bx, by, open = False):
+    if orient2d(ax, ay, bx, by, px, py) != 0:
+        return False
+    if not (min(ax, bx) <= px <= max(ax, bx) and min(ay, by) <= py <= max(ay, by)):
+        return False
+    if open and ((px == ax and py == ay) or (px == bx and py == by)):
+        return False
+    return True
@@ -0,0 +1,123 @@
+import math
+import numpy as np
+# My own defined modules
+from geometry import Point, Polygon, segment_crossings, split_polygon, sweep_visibility, batch_segment_intersections, winding_numbers
+from instrumentation import stats
+
+# An outer boundary with any number of obstacles (holes) inside of it, all of them block the view
+# The rings are kept in one Polygon whose edges are cut at every crossing once, owners tells the ring of every edge
+# (0 is the boundary, k the k-th obstacle) so whole obstacles can be left out of a query
+# bins is the number of angular bins of the occlusion buffer used for culling
+class Scene:
+    def __init__(self, boundary, obstacles = (), bins = 1024):
+        rings = [ring.vertices if isinstance(ring, Polygon) else np.asarray(ring, dtype=np.float64).reshape(-1, 2)
+            for ring in [boundary] + list(obstacles)]
+        sizes = np.array([len(ring) for ring in rings])
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        first = np.arange(sizes.sum(), dtype=np.int32)
+        # Every ring closes on its own first vertex
+        following = first + 1
+        following[starts + sizes - 1] = starts
+        self.polygon = Polygon(np.concatenate(rings), np.stack((first, following), axis=1))
+        self.owners = np.repeat(np.arange(len(rings)), sizes)
+        self.ring_starts = np.append(starts, sizes.sum())
+        self.boxes = np.array([np.concatenate((ring.min(axis=0), ring.max(axis=0))) for ring in rings]).reshape(-1, 4)
+        self.crossings = segment_crossings(self.polygon)
+        self.split = split_polygon(self.polygon, self.crossings)
+        self.split_owners = self.owners[self.split.origins]
+        self.bins = bins
+
+    def __len__(self):
+        return len(self.boxes) - 1
+
+    # True when the point is inside of the boundary and outside of every obstacle
+    def contains(self, point):
+        x, y = float(point[0]), float(point[1])
+        segments = self.polygon.segments
+        for ring, (min_x, min_y, max_x, max_y) in enumerate(self.boxes.tolist()):
+            if ring > 0 and not (min_x <= x <= max_x and min_y <= y <= max_y):
+                continue
+            edges = segments[self.ring_starts[ring]:self.ring_starts[ring + 1]]
+            inside = winding_numbers((x, y), edges, rows=1)[0] != 0
+            if inside != (ring == 0):
+                return False
+        return True
+
+    # Vertices of the visibility polygon from the viewpoint as a (K, 2) array ordered by angle
+    # With a finite max_distance the view is clipped to the square of half size max_distance around the viewpoint,
+    # obstacles outside of the square are left out, so are the obstacles hidden behind closer edges at every angle
+    def visibility(self, viewpoint, max_distance = np.inf):
+        center = np.array([float(viewpoint[0]), float(viewpoint[1])])
+        keep = np.ones(len(self.boxes), dtype=bool)
+        # Distance from the viewpoint to the bounding box of every ring
+        gaps = np.maximum(np.maximum(self.boxes[:, 0:2] - center, center - self.boxes[:, 2:4]), 0)
+        box_distances = np.hypot(gaps[:, 0], gaps[:, 1])
+        if np.isfinite(max_distance):
+            keep[1:] = np.all(gaps[1:] <= max_distance, axis=1)
+        edge_mask = keep[self.split_owners]
+        if np.isfinite(max_distance):
+            bounds = self.split.bounds
+            edge_mask &= np.all(bounds[:, 0:2] <= center + max_distance, axis=1) & np.all(bounds[:, 2:4] >= center - max_distance, axis=1)
+
+        hidden = self._occluded(center, self.split.segments[edge_mask], box_distances, keep)
+        if stats.enabled:
+            stats.count("obstacles culled", int(len(keep) - 1 - keep[1:].sum() + hidden.sum()))
+        keep &= ~hidden
+        edges = self.split.segments[edge_mask & keep[self.split_owners]]
+        if np.isfinite(max_distance):
+            edges = _clip_to_square(edges, center, max_distance)
+        return np.array(sweep_visibility(center, edges), dtype=np.float64).reshape(-1, 2)
+
+    # Mask of the obstacles whose bounding box is hidden behind the given edges at every angle it covers
+    # Every bin of the buffer holds the smallest distance beyond which some edge covering the whole bin hides everything,
+    # the largest distance to the ends of the edge bounds the edge over any part of it
+    def _occluded(self, center, edges, box_distances, candidates):
+        hidden = np.zeros(len(self.boxes), dtype=bool)
+        rings = np.flatnonzero(candidates[1:] & (box_distances[1:] > 0)) + 1
+        if len(rings) == 0 or len(edges) == 0:
+            return hidden
+        bins = self.bins
+        width = 2 * np.pi / bins
+        relative = edges - np.concatenate((center, center))
+        cross_product = relative[:, 0] * relative[:, 3] - relative[:, 1] * relative[:, 2]
+        first_angles = np.arctan2(relative[:, 1], relative[:, 0])
+        second_angles = np.arctan2(relative[:, 3], relative[:, 2])
+        starts = np.where(cross_product > 0, first_angles, second_angles)
+        spans = np.where(cross_product > 0, second_angles - first_angles, first_angles - second_angles) % (2 * np.pi)
+        spans[cross_product == 0] = 0
+        far = np.maximum(np.hypot(relative[:, 0], relative[:, 1]), np.hypot(relative[:, 2], relative[:, 3]))
+        first_bins = np.ceil((starts + np.pi) / width).astype(np.intp)
+        counts = np.maximum(np.floor((starts + spans + np.pi) / width).astype(np.intp) - first_bins, 0)
+        depth = np.full(bins, np.inf)
+        if counts.sum():
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            np.minimum.at(depth, (np.repeat(first_bins, counts) + offsets) % bins, np.repeat(far, counts))
+
+        depth = depth.tolist()
+        center_x, center_y = center.tolist()
+        for ring in rings.tolist():
+            min_x, min_y, max_x, max_y = self.boxes[ring].tolist()
+            middle = math.atan2((min_y + max_y) / 2 - center_y, (min_x + max_x) / 2 - center_x)
+            # Angles of the corners around the direction of the middle of the box, the box doesn't hold the center
+            angles = [(math.atan2(y - center_y, x - center_x) - middle + np.pi) % (2 * np.pi) - np.pi
+                for x, y in ((min_x, min_y), (max_x, min_y), (min_x, max_y), (max_x, max_y))]
+            first = math.floor((middle + min(angles) + np.pi) / width)
+            last = math.floor((middle + max(angles) + np.pi) / width)
+            distance = box_distances[ring]
+            hidden[ring] = all(depth[index % bins] < distance for index in range(first, last + 1))
+        return hidden
+
+# The edges cut by the square of half size max_distance around the center plus the square itself,
+# the square hides everything beyond it
+def _clip_to_square(edges, center, max_distance):
+    x, y = center.tolist()
+    low_x, low_y, high_x, high_y = x - max_distance, y - max_distance, x + max_distance, y + max_distance
+    square = Polygon([(low_x, low_y), (high_x, low_y), (high_x, high_y), (low_x, high_y)])
+    count = len(edges)
+    polygon = Polygon(np.concatenate((edges.reshape(-1, 2), square.vertices)),
+        np.concatenate((np.arange(2 * count).reshape(-1, 2), square.edges + 2 * count)))
+    mask, points = batch_segment_intersections(square.segments, edges)
+    sides, indices = np.nonzero(mask)
+    crossings = sorted((int(index), count + int(side), Point(*point)) for side, index, point in
+        zip(sides.tolist(), indices.tolist(), points[sides, indices].tolist()))
+    return split_polygon(polygon, crossings).segments
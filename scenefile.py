@@ -0,0 +1,161 @@
+import numpy as np
+# My own defined modules
+from geometry import Point, Polygon, EdgeGrid, segment_crossings, split_polygon
+
+# Binary container (.vis files) for a polygon, what is precomputed from it and visibility results, loaded with numpy.memmap
+# Every array is a section that is read in place, loading a scene copies nothing and processes opening
+# the same file share its pages through the page cache
+#
+# Layout, all little endian:
+#   header    magic "VISSCENE", version (u4), number of sections (u4)
+#   table     one 64 byte entry per section: name (24 bytes), numpy dtype string (8 bytes), ndim (u4),
+#             unused (u4), shape (2 u8), byte offset of the data (u8)
+#   data      the arrays in C order, each starting at a multiple of 64 bytes
+#
+# Sections:
+#   vertices (N, 2) f8, edges (E, 2) i4                           the polygon
+#   crossings (C, 2) i4, crossing_points (C, 2) f8                the self intersections (segment_crossings)
+#   split_segments (S, 4) f8, split_origins (S,) i4               the edges cut at the crossings, ready for the sweep
+#   grid_parameters (5,) f8 = origin x, origin y, cell size,      the EdgeGrid over the split segments in CSR form,
+#     cells along x, cells along y                                the grid is rebuilt from these without looking at the segments
+#   grid_cells (G, 2) i8, grid_starts (G + 1,) i8, grid_edges (I,) i8   the edges of cell k are grid_edges[grid_starts[k]:grid_starts[k + 1]]
+#   result_viewpoints (M, 2) f8, result_offsets (M + 1,) i8, result_points (K, 2) f8
+#                                                                 the vertices of result i are result_points[result_offsets[i]:result_offsets[i + 1]]
+
+magic = b"VISSCENE"
+version = 2
+alignment = 64
+header_dtype = np.dtype([("magic", "S8"), ("version", "<u4"), ("count", "<u4")])
+section_dtype = np.dtype([("name", "S24"), ("dtype", "S8"), ("ndim", "<u4"), ("unused", "<u4"), ("shape", "<u8", (2,)), ("offset", "<u8")])
+
+def _aligned(offset):
+    return (offset + alignment - 1) // alignment * alignment
+
+# Writes the arrays of the sections dict, names up to 24 characters and at most two dimensions
+def write_sections(path, sections):
+    arrays = [(name, np.ascontiguousarray(array)) for name, array in sections.items()]
+    header = np.zeros(1, dtype=header_dtype)
+    header["magic"] = magic
+    header["version"] = version
+    header["count"] = len(arrays)
+    table = np.zeros(len(arrays), dtype=section_dtype)
+    offset = _aligned(header_dtype.itemsize + section_dtype.itemsize * len(arrays))
+    for entry, (name, array) in zip(table, arrays):
+        if array.ndim > 2:
+            raise ValueError("Section " + name + " has more than two dimensions")
+        entry["name"] = name.encode("ascii")
+        entry["dtype"] = array.dtype.newbyteorder("<").str.encode("ascii")
+        entry["ndim"] = array.ndim
+        entry["shape"][:array.ndim] = array.shape
+        entry["offset"] = offset
+        offset = _aligned(offset + array.nbytes)
+
+    with open(path, "wb") as file:
+        header.tofile(file)
+        table.tofile(file)
+        for entry, (name, array) in zip(table, arrays):
+            file.write(b"\0" * (int(entry["offset"]) - file.tell()))
+            array.astype(array.dtype.newbyteorder("<"), copy=False).tofile(file)
+
+# Maps every section of the file, returns a dict of name -> read only memmap views
+def read_sections(path):
+    raw = np.memmap(path, dtype=np.uint8, mode="r")
+    header = raw[:header_dtype.itemsize].view(header_dtype)[0]
+    if header["magic"] != magic:
+        raise ValueError(path + " is not a scene file")
+    if header["version"] != version:
+        raise ValueError("Unsupported scene file version " + str(header["version"]))
+    end = header_dtype.itemsize + section_dtype.itemsize * int(header["count"])
+    sections = {}
+    for entry in raw[header_dtype.itemsize:end].view(section_dtype).tolist():
+        name, dtype, ndim, _, shape, offset = entry
+        dtype = np.dtype(dtype.decode("ascii"))
+        shape = tuple(int(size) for size in shape[:ndim])
+        size = dtype.itemsize * int(np.prod(shape))
+        sections[name.decode("ascii")] = raw[offset:offset + size].view(dtype).reshape(shape)
+    return sections
+
+# Saves the polygon (vertices or a Polygon) with its crossings, split segments and edge grid when precompute is set
+# results are optional visibility results as (viewpoints (M, 2), [(K, 2) arrays of vertices])
+def save_scene(path, vertices, results = None, precompute = True):
+    polygon = vertices if isinstance(vertices, Polygon) else Polygon(vertices)
+    sections = {"vertices": polygon.vertices, "edges": polygon.edges}
+    if precompute:
+        crossings = segment_crossings(polygon)
+        split = split_polygon(polygon, crossings)
+        sections["crossings"] = np.array([(first, second) for first, second, _ in crossings], dtype=np.int32).reshape(-1, 2)
+        sections["crossing_points"] = np.array([point for _, _, point in crossings], dtype=np.float64).reshape(-1, 2)
+        sections["split_segments"] = split.segments
+        sections["split_origins"] = split.origins
+        grid = EdgeGrid(split)
+        cells = sorted(grid.cells)
+        sections["grid_parameters"] = np.array([grid.origin[0], grid.origin[1], grid.cell_size, grid.shape[0], grid.shape[1]], dtype=np.float64)
+        sections["grid_cells"] = np.array(cells, dtype=np.int64).reshape(-1, 2)
+        sections["grid_starts"] = np.concatenate(([0], np.cumsum([len(grid.cells[cell]) for cell in cells], dtype=np.int64)))
+        sections["grid_edges"] = np.concatenate([grid.cells[cell] for cell in cells]).astype(np.int64) if cells else np.empty(0, dtype=np.int64)
+    if results is not None:
+        viewpoints, polygons = results
+        sections["result_viewpoints"] = np.asarray(viewpoints, dtype=np.float64).reshape(-1, 2)
+        sections["result_offsets"] = np.concatenate(([0], np.cumsum([len(points) for points in polygons], dtype=np.int64)))
+        sections["result_points"] = np.concatenate([np.asarray(points, dtype=np.float64).reshape(-1, 2) for points in polygons]) \
+            if len(polygons) else np.empty((0, 2))
+    write_sections(path, sections)
+
+# A mapped scene file, the arrays are views on the file and can go straight into the geometry functions
+# (sweep_visibility takes segments as an (S, 4) array), what the file lacks is computed on first use
+class SceneFile:
+    def __init__(self, path):
+        self.path = path
+        self.sections = read_sections(path)
+        self._polygon = None
+        self._edge_index = None
+
+    def __len__(self):
+        return len(self.sections["edges"])
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    @property
+    def polygon(self):
+        if self._polygon is None:
+            self._polygon = Polygon(self.sections["vertices"], self.sections["edges"])
+        return self._polygon
+
+    # Self intersections in the form segment_crossings gives them
+    @property
+    def crossings(self):
+        if "crossings" not in self.sections:
+            return segment_crossings(self.polygon)
+        return [(first, second, Point(x, y)) for (first, second), (x, y) in
+            zip(self.sections["crossings"].tolist(), self.sections["crossing_points"].tolist())]
+
+    # Edges cut at the self intersections as an (S, 4) array, the input of the sweep
+    @property
+    def segments(self):
+        if "split_segments" not in self.sections:
+            self.sections["split_segments"] = split_polygon(self.polygon, self.crossings).segments
+        return self.sections["split_segments"]
+
+    # EdgeGrid over the segments, the cells are views on the stored CSR arrays
+    @property
+    def edge_index(self):
+        if self._edge_index is None:
+            if "grid_cells" in self.sections:
+                origin_x, origin_y, cell_size, shape_x, shape_y = self.sections["grid_parameters"].tolist()
+                self._edge_index = EdgeGrid(self.segments, cell_size, (self.sections["grid_cells"],
+                    self.sections["grid_starts"], self.sections["grid_edges"]), (origin_x, origin_y), (shape_x, shape_y))
+            else:
+                self._edge_index = EdgeGrid(self.segments)
+        return self._edge_index
+
+    def result_count(self):
+        return len(self.sections["result_offsets"]) - 1 if "result_offsets" in self.sections else 0
+
+    # Viewpoint and (K, 2) vertices of the i-th stored result
+    def result(self, index):
+        offsets = self.sections["result_offsets"]
+        return self.sections["result_viewpoints"][index], self.sections["result_points"][offsets[index]:offsets[index + 1]]
+
+def load_scene(path):
+    return SceneFile(path)
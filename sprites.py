@@ -1,15 +1,63 @@
 import pygame
 
+# Alpha values of a pulse going up and down by step between low and high, computed once for every set of parameters
+# and shared by all the sprites animated the same way, the values repeat from the loop index on
+pulse_schedules = {}
+
+def pulse_schedule(start, step, low, high):
+    key = (start, step, low, high)
+    if key not in pulse_schedules:
+        alphas = []
+        positions = {}
+        alpha = start
+        increase_alpha = True
+        while (alpha, increase_alpha) not in positions:
+            positions[(alpha, increase_alpha)] = len(alphas)
+            if increase_alpha:
+                alpha = alpha + step
+            else:
+                alpha = alpha - step
+            if alpha >= high:
+                increase_alpha = False
+                alpha = high
+            elif alpha <= low:
+                increase_alpha = True
+                alpha = low
+            alphas.append(alpha)
+        pulse_schedules[key] = (tuple(alphas), positions[(alpha, increase_alpha)])
+    return pulse_schedules[key]
+
+# Position of one sprite in a shared pulse schedule
+class Pulse:
+    __slots__ = ("alphas", "loop", "index")
+
+    def __init__(self, start, step, low, high):
+        self.alphas, self.loop = pulse_schedule(start, step, low, high)
+        self.index = -1
+
+    def next(self):
+        self.index = self.index + 1
+        if self.index >= len(self.alphas):
+            self.index = self.loop
+        return self.alphas[self.index]
+
+# Surface for a shape drawn once in opaque colors, the colorkey makes the rest transparent
+# and surface alpha then fades the whole shape, with any pygame version
+def _shape_surface(size, *colors):
+    used = [(color.r, color.g, color.b) for color in colors]
+    colorkey = pygame.color.Color(*next(key for key in ((255, 0, 255), (0, 255, 0), (0, 255, 255)) if key not in used))
+    surface = pygame.surface.Surface(size)
+    surface.fill(colorkey)
+    surface.set_colorkey(colorkey)
+    return surface
+
+# The shapes below are rasterized once, an animated shape pulses through the alpha of its surface
 class Ngon(pygame.sprite.Sprite):
     def __init__(self, points, color=pygame.color.Color('black'), animated = True):
         pygame.sprite.Sprite.__init__(self)
         self.points = points
-        self.color = color
-        self.animated = animated
-        if self.animated:
-            self.alpha = 0
-            self.increase_alpha = True
-            self.color = pygame.color.Color(color.r, color.g, color.b, color.a)
+        self.color = pygame.color.Color(color.r, color.g, color.b)
+        self.pulse = Pulse(0, 4, 50, 255) if animated else None
         # Python shines :)
         self.min_x = min(point[0] for point in points)
         self.min_y = min(point[1] for point in points)
@@ -18,116 +66,81 @@ class Ngon(pygame.sprite.Sprite):
         self.points_on_ngon = [(point[0] - self.min_x, point[1] - self.min_y) for point in points]
         self.rect = pygame.rect.Rect(self.min_x, self.min_y, self.max_x - self.min_x, self.max_y - self.min_y)
         # One extra pixel space for proper display
-        self.image = pygame.surface.Surface((self.max_x - self.min_x + 1, self.max_y - self.min_y + 1), pygame.locals.SRCALPHA)
-        self.image.set_alpha(0)
+        self.image = _shape_surface((self.max_x - self.min_x + 1, self.max_y - self.min_y + 1), self.color)
+        self.draw()
+        self.image.set_alpha(0 if animated else 255)
+
+    def draw(self):
         pygame.gfxdraw.filled_polygon(self.image, self.points_on_ngon, self.color)
 
     def set_color(self, color):
-        self.color = color
-        if self.animated:
-            color.a = self.alpha
+        self.color = pygame.color.Color(color.r, color.g, color.b)
+        self.draw()
 
     def update(self):
-        if self.animated:
-            if self.increase_alpha:
-                self.alpha = self.alpha + 4
-            else:
-                self.alpha = self.alpha - 4
-
-            if self.alpha >= 255:
-                self.increase_alpha = False
-                self.alpha = 255
-            elif self.alpha <= 50:
-                self.increase_alpha = True
-                self.alpha = 50
-
-            self.color.a = self.alpha
-            pygame.gfxdraw.filled_polygon(self.image, self.points_on_ngon, self.color)
+        if self.pulse:
+            self.image.set_alpha(self.pulse.next())
 
-class Triangle(pygame.sprite.Sprite):
+class Triangle(Ngon):
     def __init__(self, first_point, second_point, third_point, color=pygame.color.Color('black'), animated = True):
-        pygame.sprite.Sprite.__init__(self)
         self.first_point = first_point
         self.second_point = second_point
         self.third_point = third_point
-        self.color = color
-        self.animated = animated
-        if self.animated:
-            self.alpha = 100
-            self.increase_alpha = True
-            self.color = pygame.color.Color(color.r, color.g, color.b, color.a)
-        self.min_x = min(first_point[0], second_point[0], third_point[0])
-        self.min_y = min(first_point[1], second_point[1], third_point[1])
-        self.max_x = max(first_point[0], second_point[0], third_point[0])
-        self.max_y = max(first_point[1], second_point[1], third_point[1])
-        self.rect = pygame.rect.Rect(self.min_x, self.min_y, self.max_x - self.min_x, self.max_y - self.min_y)
-        self.image = pygame.surface.Surface((self.max_x - self.min_x, self.max_y - self.min_y), pygame.locals.SRCALPHA)
-        self.image.set_alpha(0)
-        pygame.gfxdraw.filled_trigon(self.image, self.first_point[0] - self.min_x, self.first_point[1] - self.min_y,
-            self.second_point[0] - self.min_x, self.second_point[1] - self.min_y, self.third_point[0] - self.min_x, self.third_point[1] - self.min_y, self.color)
+        Ngon.__init__(self, [first_point, second_point, third_point], color, animated)
+        if animated:
+            self.pulse = Pulse(100, 10, 50, 255)
+            self.image.set_alpha(100)
 
-    def set_color(self, color):
-        self.color = color
-        if self.animated:
-            color.a = self.alpha
+    def draw(self):
+        (first_x, first_y), (second_x, second_y), (third_x, third_y) = self.points_on_ngon
+        pygame.gfxdraw.filled_trigon(self.image, first_x, first_y, second_x, second_y, third_x, third_y, self.color)
 
-    def update(self):
-        if self.animated:
-            if self.increase_alpha:
-                self.alpha = self.alpha + 10
-            else:
-                self.alpha = self.alpha - 10
-
-            if self.alpha >= 255:
-                self.increase_alpha = False
-                self.alpha = 255
-            elif self.alpha <= 50:
-                self.increase_alpha = True
-                self.alpha = 50
-
-            self.color.a = self.alpha
-            pygame.gfxdraw.filled_trigon(self.image, self.first_point[0] - self.min_x, self.first_point[1] - self.min_y,
-                self.second_point[0] - self.min_x, self.second_point[1] - self.min_y, self.third_point[0] - self.min_x, self.third_point[1] - self.min_y, self.color)
+# The whole visibility polygon with its fan of rays from the center, the area and the rays are drawn once
+# onto one cached surface and it pulses through the surface alpha only, a frame costs the same for any number of vertices
+# The rays have their own color so they stay visible on top of the area
+# A polygon that isn't closed yet (still being computed) is filled as a fan from the center over its vertices
+class VisibilityPolygon(pygame.sprite.Sprite):
+    def __init__(self, center, vertices, color = pygame.color.Color('black'), ray_color = pygame.color.Color('gray60'), animated = True, closed = True):
+        pygame.sprite.Sprite.__init__(self)
+        self.center = center
+        self.vertices = vertices
+        self.pulse = Pulse(100, 10, 50, 255) if animated else None
+        points = list(vertices) + [center]
+        self.min_x = min(point[0] for point in points)
+        self.min_y = min(point[1] for point in points)
+        self.max_x = max(point[0] for point in points)
+        self.max_y = max(point[1] for point in points)
+        self.rect = pygame.rect.Rect(self.min_x, self.min_y, self.max_x - self.min_x + 1, self.max_y - self.min_y + 1)
+        self.image = _shape_surface((self.rect.width, self.rect.height), color, ray_color)
+        center_x, center_y = center[0] - self.min_x, center[1] - self.min_y
+        on_surface = [(point[0] - self.min_x, point[1] - self.min_y) for point in vertices]
+        area = on_surface if closed else [(center_x, center_y)] + on_surface
+        if len(area) >= 3:
+            pygame.gfxdraw.filled_polygon(self.image, area, color)
+        for x, y in on_surface:
+            pygame.gfxdraw.line(self.image, center_x, center_y, x, y, ray_color)
+        self.image.set_alpha(100 if animated else 255)
 
+    def update(self):
+        if self.pulse:
+            self.image.set_alpha(self.pulse.next())
 
 class Circle(pygame.sprite.Sprite):
     def __init__(self, center, radius, color = pygame.color.Color('black'), width = 1, animated = True):
         pygame.sprite.Sprite.__init__(self)
         self.center = center
         self.radius = radius
-        self.color = color
+        self.color = pygame.color.Color(color.r, color.g, color.b)
         self.width = width
-        self.animated = animated
-        if self.animated:
-            self.alpha = 100
-            self.increase_alpha = True
-            self.color = pygame.color.Color(color.r, color.g, color.b, color.a)
-        # For gfxdraw there is a little suplimentary space needed (+2)
-        self.image = pygame.surface.Surface((2*radius, 2*radius), pygame.locals.SRCALPHA)
-        self.image.set_alpha(0)
-
+        self.pulse = Pulse(100, 10, 80, 255) if animated else None
+        self.image = _shape_surface((2*radius, 2*radius), self.color)
         self.rect = pygame.draw.circle(self.image, self.color, (radius, radius), radius, width)
         self.rect.center = center
-        # pygame.gfxdraw.circle(self.image, radius, radius, radius, self.color)
-        # self.rect = pygame.rect.Rect(center[0]-radius, center[1]-radius, radius, radius)
+        self.image.set_alpha(100 if animated else 255)
 
     def update(self):
-        if self.animated:
-            if self.increase_alpha:
-                self.alpha = self.alpha + 10
-            else:
-                self.alpha = self.alpha - 10
-
-            if self.alpha >= 255:
-                self.increase_alpha = False
-                self.alpha = 255
-            elif self.alpha <= 80:
-                self.increase_alpha = True
-                self.alpha = 80
-
-            self.color.a = self.alpha
-            pygame.draw.circle(self.image, self.color, (self.radius, self.radius), self.radius, self.width)
-            # pygame.gfxdraw.circle(self.image, self.radius, self.radius, self.radius, self.color)
+        if self.pulse:
+            self.image.set_alpha(self.pulse.next())
 
 # To draw a sprite in the current way game work you need to have an image=surface and a rect=rectangle associated with it
 class Line(pygame.sprite.Sprite):
@@ -169,9 +182,46 @@ class Line(pygame.sprite.Sprite):
         self.rect.x = offset_x
         self.rect.y = offset_y
 
+# The line following the cursor while drawing, it moves every frame so it draws into one pooled surface
+# that only grows when the line gets longer than ever before, the pool is the image and keeps its colorkey,
+# a move only clears the part the last line used and draws the new line there
+class RubberBandLine(Line):
+    def __init__(self, start_pos, end_pos, color = pygame.color.Color("black"), width=None):
+        self.pool = None
+        self.used = None
+        Line.__init__(self, start_pos, end_pos, color, width)
+
+    def set_position(self, start_pos, end_pos):
+        self.start_position, self.end_position = start_pos, end_pos
+        offset_x = min(start_pos[0], end_pos[0]) - 1
+        offset_y = min(start_pos[1], end_pos[1]) - 1
+        self.start_position_on_surface = (start_pos[0] - offset_x, start_pos[1] - offset_y)
+        self.end_position_on_surface = (end_pos[0] - offset_x, end_pos[1] - offset_y)
+        width = abs(start_pos[0] - end_pos[0]) + 3
+        height = abs(start_pos[1] - end_pos[1]) + 3
+
+        colorkey = pygame.color.Color('white')
+        if self.pool is None or width > self.pool.get_width() or height > self.pool.get_height():
+            # Grow by doubling so dragging the line out costs a few allocations at most
+            pool_width = max(width, 2 * self.pool.get_width() if self.pool else 64)
+            pool_height = max(height, 2 * self.pool.get_height() if self.pool else 64)
+            self.pool = pygame.surface.Surface((pool_width, pool_height))
+            self.pool.set_colorkey(colorkey)
+            self.pool.fill(colorkey)
+        else:
+            self.pool.fill(colorkey, self.used)
+        self.used = pygame.rect.Rect(0, 0, width, height)
+        self.image = self.pool
+        if self.width == None:
+            pygame.gfxdraw.line(self.image, self.start_position_on_surface[0], self.start_position_on_surface[1], self.end_position_on_surface[0], self.end_position_on_surface[1],self.color)
+        else:
+            pygame.draw.line(self.image, self.color, self.start_position_on_surface, self.end_position_on_surface, self.width)
+        self.rect = pygame.rect.Rect(offset_x, offset_y, self.pool.get_width(), self.pool.get_height())
+
 class Text(pygame.sprite.Sprite):
     # Constructor. Pass in the color of the block,
     # and its x and y position
+    # set_text only renders again when the text changed
     def __init__(self, text = "", color = pygame.color.Color('black'), font_size = 24):
         # Call the parent class (Sprite) constructor
         pygame.sprite.Sprite.__init__(self)
@@ -181,6 +231,7 @@ class Text(pygame.sprite.Sprite):
         self.anchor = None
         self.x = None
         self.y = None
+        self.text = None
         self.set_text(text)
         self.rect = self.image.get_rect()
 
@@ -200,6 +251,9 @@ class Text(pygame.sprite.Sprite):
         self.rect.centery = y
 
     def set_text(self, text):
+        if text == self.text:
+            return
+        self.text = text
         self.image = self.font.render(text, 1, self.color)
         if self.anchor:
             self.rect = self.image.get_rect()
@@ -0,0 +1,102 @@
+import os
+import sys
+import csv
+import json
+import shutil
+import tempfile
+import subprocess
+import unittest
+import numpy as np
+# My own defined modules
+from geometry import visibility_polygon, sweep_visibility
+from scene import Scene
+from batch import run, read_scene, NpzWriter, batch_visibility
+from benchmark import random_polygon, inside_points
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        rng = np.random.default_rng(9)
+        self.vertices = random_polygon(200, rng)
+        self.viewpoints = inside_points(self.vertices, 40, rng)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    # The results come in the order of the viewpoints, every worker reports what it did
+    def test_batch_visibility(self):
+        worker_stats = {}
+        results = list(batch_visibility(self.vertices, self.viewpoints, workers=2, chunk_size=3, stats=worker_stats))
+        self.assertEqual(len(results), len(self.viewpoints))
+        for viewpoint, points in zip(self.viewpoints, results):
+            np.testing.assert_allclose(points, visibility_polygon(self.vertices, viewpoint))
+        self.assertEqual(sum(worker["viewpoints"] for worker in worker_stats.values()), len(self.viewpoints))
+        self.assertTrue(all(worker["throughput"] > 0 for worker in worker_stats.values()))
+
+    # The command line with every output format gives the visibility polygon of every viewpoint in order
+    def test_command_line(self):
+        with open(self.path("scene.json"), "w") as file:
+            json.dump({"vertices": self.vertices.tolist()}, file)
+        np.savetxt(self.path("viewpoints.csv"), self.viewpoints, delimiter=",", header="x,y", comments="")
+        expected = [visibility_polygon(self.vertices, viewpoint) for viewpoint in self.viewpoints]
+        for output in ("results.csv", "results.jsonl", "results.json", "results.npz"):
+            subprocess.run([sys.executable, os.path.join(here, "batch.py"), self.path("scene.json"), self.path("viewpoints.csv"),
+                "--output", self.path(output), "--workers", "2", "--chunk-size", "7", "--quiet", "--summary", self.path("summary.json")],
+                check=True, cwd=here, stderr=subprocess.DEVNULL)
+            if output.endswith(".csv"):
+                with open(self.path(output), newline="") as file:
+                    rows = list(csv.DictReader(file))
+                found = [np.array(row["vertices"].split(), dtype=np.float64).reshape(-1, 2) for row in rows]
+                indices = [int(row["index"]) for row in rows]
+            elif output.endswith(".npz"):
+                with np.load(self.path(output)) as data:
+                    found = np.split(data["points"], data["offsets"][1:-1])
+                    indices = list(range(len(data["viewpoints"])))
+            else:
+                with open(self.path(output)) as file:
+                    records = json.load(file) if output.endswith(".json") else [json.loads(line) for line in file]
+                found = [np.array(record["vertices"], dtype=np.float64).reshape(-1, 2) for record in records]
+                indices = [record["index"] for record in records]
+            self.assertEqual(indices, list(range(len(self.viewpoints))), output)
+            for points, reference in zip(found, expected):
+                np.testing.assert_allclose(points, reference, err_msg=output)
+            with open(self.path("summary.json")) as file:
+                self.assertEqual(json.load(file)["viewpoints"], len(self.viewpoints))
+
+    # Obstacles come as a Scene, the workers use its split edges and cull what is hidden
+    def test_obstacles(self):
+        boundary = [(0, 0), (100, 0), (100, 100), (0, 100)]
+        obstacles = [[(x, y), (x + 4, y), (x + 4, y + 4), (x, y + 4)] for x in range(10, 90, 10) for y in range(10, 90, 10)]
+        with open(self.path("scene.json"), "w") as file:
+            json.dump({"boundary": boundary, "obstacles": obstacles}, file)
+        scene = read_scene(self.path("scene.json"))
+        self.assertIsInstance(scene, Scene)
+        viewpoints = np.array([(5.5, 5.5), (52, 47), (97, 33), (33, 97)])
+        np.save(self.path("viewpoints.npy"), viewpoints)
+        writer = NpzWriter(self.path("results.npz"))
+        summary = run(self.path("scene.json"), self.path("viewpoints.npy"), writer, workers=2)
+        self.assertEqual(summary["edges"], 4 + 4 * len(obstacles))
+        for viewpoint, points in zip(viewpoints, np.split(np.concatenate(writer.points), np.cumsum(writer.counts)[:-1])):
+            np.testing.assert_allclose(points, np.array(sweep_visibility(viewpoint, scene.split)).reshape(-1, 2))
+
+    # A failure while reading the viewpoints still closes the writer with what was written before
+    def test_writer_closed_on_failure(self):
+        with open(self.path("scene.json"), "w") as file:
+            json.dump(self.vertices.tolist(), file)
+        with open(self.path("viewpoints.jsonl"), "w") as file:
+            for viewpoint in self.viewpoints.tolist():
+                file.write(json.dumps(viewpoint) + "\n")
+            file.write("not json\n")
+        with self.assertRaises(ValueError):
+            run(self.path("scene.json"), self.path("viewpoints.jsonl"), NpzWriter(self.path("results.npz")), workers=1,
+                chunk_size=10, read_size=10)
+        with np.load(self.path("results.npz")) as data:
+            self.assertGreater(len(data["viewpoints"]), 0)
+
+if __name__ == '__main__':
+    unittest.main()
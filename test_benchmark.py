@@ -0,0 +1,28 @@
+import unittest
+import copy
+# My own defined modules
+from benchmark import run, compare
+
+class BenchmarkTest(unittest.TestCase):
+    def test_run(self):
+        results = run(["star", "comb"], [12], viewpoints=2, repeat=1, drag_steps=(0.1,))
+        self.assertEqual(sorted(results["results"]), ["comb/12", "star/12"])
+        for result in results["results"].values():
+            self.assertGreater(result["vertices"], 0)
+            self.assertEqual(result["viewpoints"], 2)
+            self.assertTrue(all(seconds >= 0 for seconds in result["stages"].values()))
+
+    def test_compare(self):
+        results = run(["star"], [12], viewpoints=1, repeat=1)
+        self.assertEqual(compare(results, results), [])
+        slower = copy.deepcopy(results)
+        stage = next(iter(slower["results"]["star/12"]["stages"]))
+        slower["results"]["star/12"]["stages"][stage] += 1.0
+        regressions = compare(slower, results)
+        self.assertEqual([(regression["case"], regression["stage"]) for regression in regressions], [("star/12", stage)])
+        # A case with another number of vertices is not comparable
+        slower["results"]["star/12"]["vertices"] += 1
+        self.assertEqual(compare(slower, results), [])
+
+if __name__ == '__main__':
+    unittest.main()
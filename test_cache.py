@@ -0,0 +1,82 @@
+import unittest
+import numpy as np
+# My own defined modules
+from geometry import Polygon
+from cache import VisibilityCache, polygon_fingerprint
+
+# A square with a square hole, the vertices of both rings in one array
+vertices = np.array([(0, 0), (10, 0), (10, 10), (0, 10), (4, 4), (4, 6), (6, 6), (6, 4)], dtype=np.float64)
+outer = [(0, 1), (1, 2), (2, 3), (3, 0)]
+hole = [(4, 5), (5, 6), (6, 7), (7, 4)]
+
+class VisibilityCacheTest(unittest.TestCase):
+    def test_counters(self):
+        cache = VisibilityCache()
+        first = cache.visibility(vertices[:4], (1.2, 1.2))
+        second = cache.visibility(vertices[:4], (1.7, 1.4))
+        self.assertIs(first, second)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual((stats["polygon_hits"], stats["polygon_misses"]), (1, 1))
+        self.assertEqual(stats["bytes"], first.nbytes)
+
+    # The edges are part of the key, the same vertices with a hole are another polygon
+    def test_edges_in_fingerprint(self):
+        cache = VisibilityCache()
+        without_hole = cache.visibility(Polygon(vertices, outer), (1, 1))
+        with_hole = cache.visibility(Polygon(vertices, outer + hole), (1, 1))
+        self.assertNotEqual(polygon_fingerprint(Polygon(vertices, outer)), polygon_fingerprint(Polygon(vertices, outer + hole)))
+        self.assertEqual(cache.stats()["misses"], 2)
+        self.assertEqual(len(without_hole), 4)
+        self.assertGreater(len(with_hole), 4)
+
+    # A prepared polygon is not hashed again and still shares the results
+    def test_prepared(self):
+        cache = VisibilityCache()
+        prepared = cache.prepare(vertices[:4])
+        cache.visibility(vertices[:4], (1, 1))
+        cache.visibility(prepared, (1, 1))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["polygon_hits"], stats["polygon_misses"]), (1, 1, 1))
+
+    def test_lru_eviction(self):
+        cache = VisibilityCache(max_entries=2)
+        prepared = cache.prepare(vertices[:4])
+        for viewpoint in ((1, 1), (2, 2), (1, 1), (3, 3)):
+            cache.visibility(prepared, viewpoint)
+        # (2, 2) was the least recently used one
+        self.assertEqual(cache.stats()["entries"], 2)
+        cache.visibility(prepared, (1, 1))
+        cache.visibility(prepared, (2, 2))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 4))
+
+    def test_max_bytes(self):
+        cache = VisibilityCache(max_bytes=100)
+        prepared = cache.prepare(vertices[:4])
+        for viewpoint in ((1, 1), (2, 2), (3, 3)):
+            result = cache.visibility(prepared, viewpoint)
+        stats = cache.stats()
+        # Every square result is 64 bytes, only one of them fits
+        self.assertEqual((stats["entries"], stats["bytes"]), (1, result.nbytes))
+
+    def test_polygon_eviction_drops_results(self):
+        cache = VisibilityCache(max_polygons=1)
+        cache.visibility(vertices[:4], (1, 1))
+        cache.visibility(Polygon(vertices, outer + hole), (1, 1))
+        stats = cache.stats()
+        self.assertEqual((stats["polygons"], stats["entries"]), (1, 1))
+
+    def test_invalidate(self):
+        cache = VisibilityCache()
+        prepared = cache.prepare(vertices[:4])
+        cache.visibility(prepared, (1, 1))
+        cache.visibility(prepared, (5, 5))
+        cache.invalidate(vertices[:4])
+        stats = cache.stats()
+        self.assertEqual((stats["polygons"], stats["entries"], stats["bytes"]), (0, 0, 0))
+        cache.visibility(vertices[:4], (1, 1))
+        self.assertEqual(cache.stats()["polygon_misses"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
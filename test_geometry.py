@@ -0,0 +1,278 @@
+import sys
+import unittest
+import subprocess
+from fractions import Fraction
+import numpy as np
+# My own defined modules
+from predicates import orient2d
+from geometry import Point, Segment, Polygon, EdgeGrid, visibility_polygon, segment_crossings, \
+    batch_segment_intersections, pairwise_segment_intersections, winding_numbers, points_inside_polygon, inside_polygon, \
+    locate_on_polygon, order_on_polygon, visibility_polygon_locations, dedupe_ring, split_polygon, PointHash, dedupe_points, \
+    PolygonTopology
+from benchmark import random_polygon, star_polygon, spiral_polygon, scribble_polygon, inside_points
+
+# Brute force checks of the fast paths, run with python -m pytest or python -m unittest
+
+# Distance from the origin to the closest of the edges along every direction, inf where nothing is hit
+def ray_distances(origin, directions, edges, length):
+    rays = np.column_stack((np.tile(origin, (len(directions), 1)), origin + length * directions))
+    mask, points = batch_segment_intersections(rays, edges)
+    distances = np.einsum('ijk,ik->ij', points - origin, directions)
+    distances[~mask] = np.inf
+    return distances.min(axis=1)
+
+# Exact intersection of two segments with rationals, None when they don't meet
+# For colinear overlapping segments the first common point along the first segment, like the kernel
+def exact_intersection(first, second):
+    (px, py, qx, qy), (rx, ry, sx, sy) = [[Fraction(value) for value in segment] for segment in (first, second)]
+    dx, dy, ex, ey = qx - px, qy - py, sx - rx, sy - ry
+    denominator = dx * ey - dy * ex
+    cross_s = (rx - px) * ey - (ry - py) * ex
+    cross_r = (rx - px) * dy - (ry - py) * dx
+    if denominator != 0:
+        t, u = cross_s / denominator, cross_r / denominator
+        return (px + t * dx, py + t * dy) if 0 <= t <= 1 and 0 <= u <= 1 else None
+    length = dx * dx + dy * dy
+    if cross_r != 0 or length == 0:
+        return None
+    t0 = ((rx - px) * dx + (ry - py) * dy) / length
+    t1 = t0 + (ex * dx + ey * dy) / length
+    start, end = max(min(t0, t1), 0), min(max(t0, t1), 1)
+    return (px + start * dx, py + start * dy) if start <= end else None
+
+class KernelTest(unittest.TestCase):
+    # Random segments on a small integer grid meet often at endpoints and overlap when colinear
+    def test_against_rationals(self):
+        rng = np.random.default_rng(11)
+        queries = rng.integers(0, 6, (60, 4)).astype(np.float64)
+        edges = rng.integers(0, 6, (80, 4)).astype(np.float64)
+        mask, points = batch_segment_intersections(queries, edges)
+        for i, query in enumerate(queries.tolist()):
+            for j, edge in enumerate(edges.tolist()):
+                expected = exact_intersection(query, edge)
+                self.assertEqual(bool(mask[i, j]), expected is not None, (query, edge))
+                if expected is not None:
+                    np.testing.assert_allclose(points[i, j], [float(value) for value in expected], atol=1e-12)
+        first_mask, first_points = pairwise_segment_intersections(queries, edges[:60])
+        np.testing.assert_array_equal(first_mask, mask[np.arange(60), np.arange(60)])
+        np.testing.assert_allclose(first_points[first_mask], points[np.arange(60), np.arange(60)][first_mask])
+
+class SweepTest(unittest.TestCase):
+    # Every sampled ray from the viewpoint has to leave the visibility polygon where it first hits the polygon
+    def test_against_sampled_rays(self):
+        rng = np.random.default_rng(0)
+        for generator in (random_polygon, star_polygon, spiral_polygon, scribble_polygon):
+            vertices = generator(200, rng)
+            polygon = Polygon(vertices)
+            length = 4 * float(np.max(np.ptp(vertices, axis=0)))
+            angles = rng.uniform(-np.pi, np.pi, 500)
+            directions = np.column_stack((np.cos(angles), np.sin(angles)))
+            for viewpoint in inside_points(vertices, 3, rng):
+                visible = visibility_polygon(polygon, viewpoint)
+                ring = np.concatenate((visible, np.roll(visible, -1, axis=0)), axis=1)
+                expected = ray_distances(viewpoint, directions, polygon.segments, length)
+                found = ray_distances(viewpoint, directions, ring, length)
+                np.testing.assert_allclose(found, expected, rtol=1e-6, atol=0.01, err_msg=generator.__name__)
+
+class VisibilityPolygonTest(unittest.TestCase):
+    # The entry point works without a display, pygame is never imported
+    def test_headless(self):
+        code = "import sys, geometry; geometry.visibility_polygon([(0, 0), (4, 0), (4, 4), (0, 4)], (1, 1)); print('pygame' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "False")
+
+    def test_plain_lists(self):
+        square = [(0, 0), (4, 0), (4, 4), (0, 4)]
+        visible = visibility_polygon(square, (1, 1))
+        self.assertEqual(visible.shape, (4, 2))
+        np.testing.assert_allclose(sorted(map(tuple, visible.round(9).tolist())), sorted(square), atol=1e-9)
+        np.testing.assert_array_equal(visible, visibility_polygon(np.array(square, dtype=np.float64), (1, 1)))
+
+class CrossingsTest(unittest.TestCase):
+    # The grid broad phase must not lose a pair that testing all of them finds
+    def test_against_all_pairs(self):
+        rng = np.random.default_rng(1)
+        for size in (3, 50, 400):
+            edges = Polygon(scribble_polygon(size, rng)).segments
+            first, second = np.triu_indices(len(edges), 1)
+            mask, points = pairwise_segment_intersections(edges[first], edges[second])
+            for first_point in (edges[first, 0:2], edges[first, 2:4]):
+                for second_point in (edges[second, 0:2], edges[second, 2:4]):
+                    mask &= ~np.all(first_point == second_point, axis=1)
+            expected = [(int(i), int(j), Point(x, y)) for i, j, (x, y) in zip(first[mask], second[mask], points[mask])]
+            self.assertEqual(segment_crossings(edges), expected)
+
+    # A bow tie crosses once in the middle, the edges meeting at the corners don't count
+    def test_bow_tie(self):
+        crossings = segment_crossings(Polygon(np.array([(0, 0), (4, 4), (4, 0), (0, 4)], dtype=np.float64)))
+        self.assertEqual(crossings, [(0, 2, Point(2.0, 2.0))])
+
+class EdgeGridTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        starts = rng.uniform(0, 1000, (400, 2))
+        self.edges = np.concatenate((starts, starts + rng.normal(0, 40, (400, 2))), axis=1)
+        self.grid = EdgeGrid(self.edges)
+        self.rng = rng
+
+    def test_first_hit(self):
+        for _ in range(300):
+            origin = self.rng.uniform(-100, 1100, 2)
+            angle = self.rng.uniform(-np.pi, np.pi)
+            direction = np.array([np.cos(angle), np.sin(angle)])
+            expected = ray_distances(origin, direction[None], self.edges, 5000)[0]
+            hit = self.grid.first_hit(origin, direction)
+            if not np.isfinite(expected):
+                self.assertIsNone(hit)
+                continue
+            point, edge = hit
+            self.assertAlmostEqual(float(np.dot(np.array(point) - origin, direction)), expected, places=6)
+            self.assertAlmostEqual(ray_distances(origin, direction[None], self.edges[edge:edge + 1], 5000)[0], expected, places=6)
+
+    def test_any_hit(self):
+        for _ in range(300):
+            start, end = self.rng.uniform(-100, 1100, (2, 2))
+            segment = Segment(Point(*start), Point(*end))
+            mask, _ = batch_segment_intersections(np.concatenate((start, end)), self.edges)
+            self.assertEqual(self.grid.any_hit(segment), bool(mask.any()))
+
+    # One edge spanning many small cells, found from both ends, limited by max_distance and skipped on request
+    def test_long_edge(self):
+        grid = EdgeGrid(np.array([(0, 10, 100, 10)], dtype=np.float64), cell_size=1.0)
+        point, edge = grid.first_hit((50, 0), (0, 1))
+        self.assertEqual(edge, 0)
+        np.testing.assert_allclose(point, (50, 10))
+        self.assertIsNotNone(grid.first_hit((99, 20), (0, -1)))
+        self.assertIsNone(grid.first_hit((50, 0), (0, 1), max_distance=5))
+        self.assertIsNone(grid.first_hit((50, 0), (0, 1), skip=lambda points: np.ones(len(points), dtype=bool)))
+        self.assertTrue(grid.any_hit(Segment(Point(3, 0), Point(97, 20))))
+        self.assertFalse(grid.any_hit(Segment(Point(3, 0), Point(97, 9))))
+
+# Winding number of one point over all edges in plain Python, upward crossings to the right count +1
+def brute_winding_number(x, y, edges):
+    winding = 0
+    for x1, y1, x2, y2 in edges:
+        is_left = (x2 - x1) * (y - y1) - (x - x1) * (y2 - y1)
+        if y1 <= y < y2 and is_left > 0:
+            winding = winding + 1
+        elif y2 <= y < y1 and is_left < 0:
+            winding = winding - 1
+    return winding
+
+class PolygonTest(unittest.TestCase):
+    def test_arrays(self):
+        vertices = np.array([(0, 0), (4, 0), (4, 3), (0, 3)], dtype=np.float64)
+        polygon = Polygon(vertices)
+        np.testing.assert_array_equal(polygon.edges, [(0, 1), (1, 2), (2, 3), (3, 0)])
+        np.testing.assert_array_equal(polygon.segments[1], (4, 0, 4, 3))
+        np.testing.assert_array_equal(polygon.vectors[3], (0, -3))
+        np.testing.assert_array_equal(polygon.bounds[2], (0, 3, 4, 3))
+        np.testing.assert_array_equal(polygon.origins, range(4))
+        self.assertEqual(len(Polygon(vertices, [(0, 2)])), 1)
+
+    # The pieces of every cut edge follow each other from its start to its end and nothing crosses anymore
+    def test_split(self):
+        polygon = Polygon(scribble_polygon(200, np.random.default_rng(12)))
+        crossings = segment_crossings(polygon)
+        split = split_polygon(polygon, crossings)
+        self.assertEqual(len(split), len(polygon) + 2 * len(crossings))
+        self.assertEqual(segment_crossings(split), [])
+        self.assertTrue(np.all(np.diff(split.origins) >= 0))
+        for edge in range(len(polygon)):
+            pieces = split.segments[split.origins == edge]
+            np.testing.assert_array_equal(pieces[0, 0:2], polygon.segments[edge, 0:2])
+            np.testing.assert_array_equal(pieces[-1, 2:4], polygon.segments[edge, 2:4])
+            np.testing.assert_array_equal(pieces[1:, 0:2], pieces[:-1, 2:4])
+
+class WindingTest(unittest.TestCase):
+    # The row buckets must give the same winding numbers as testing every edge, also where the scribble winds twice
+    def test_against_all_edges(self):
+        rng = np.random.default_rng(3)
+        vertices = scribble_polygon(300, rng)
+        polygon = Polygon(vertices)
+        edges = polygon.segments.tolist()
+        points = rng.uniform(vertices.min(axis=0), vertices.max(axis=0), (2000, 2))
+        # Points on the vertices hit the half open ends of the rows and of the edges
+        points = np.concatenate((points, vertices[:100]))
+        expected = [brute_winding_number(x, y, edges) for x, y in points.tolist()]
+        self.assertGreater(max(abs(winding) for winding in expected), 1)
+        self.assertEqual(winding_numbers(points, polygon).tolist(), expected)
+        self.assertEqual(winding_numbers(points, polygon, rows=7, chunk_size=64).tolist(), expected)
+        inside = [inside_polygon(Point(x, y), polygon) for x, y in points[:300].tolist()]
+        self.assertEqual(points_inside_polygon(points[:300], polygon).tolist(), inside)
+
+class LocateTest(unittest.TestCase):
+    # The edge found through the grid has to be as close as the closest of all edges
+    def test_closest_edge(self):
+        rng = np.random.default_rng(7)
+        for generator in (random_polygon, spiral_polygon, scribble_polygon):
+            vertices = generator(500, rng)
+            polygon = Polygon(vertices)
+            visible = visibility_polygon(polygon, inside_points(vertices, 1, rng)[0])
+            points = np.concatenate((visible, visible + rng.normal(0, 0.001, visible.shape), vertices[:50],
+                rng.uniform(vertices.min(axis=0), vertices.max(axis=0), (100, 2))))
+            indices, parameters = locate_on_polygon(points, polygon)
+            located = polygon.segments[indices, 0:2] + parameters[:, None] * polygon.vectors[indices]
+            distances = np.hypot(*(located - points).T)
+            starts = polygon.segments[None, :, 0:2]
+            t = np.clip(np.einsum('ijk,jk->ij', points[:, None, :] - starts, polygon.vectors) /
+                np.maximum(np.einsum('ij,ij->i', polygon.vectors, polygon.vectors), 1e-300), 0, 1)
+            closest = np.hypot(*(starts + t[..., None] * polygon.vectors - points[:, None, :]).transpose(2, 0, 1)).min(axis=1)
+            np.testing.assert_allclose(distances, closest, atol=1e-9, err_msg=generator.__name__)
+
+    # The locations from the sweep give the order along the boundary with one sort
+    def test_order_on_polygon(self):
+        rng = np.random.default_rng(8)
+        vertices = random_polygon(300, rng)
+        points, edges, parameters = visibility_polygon_locations(vertices, inside_points(vertices, 1, rng)[0])
+        order = order_on_polygon(edges, parameters)
+        np.testing.assert_array_equal(order, order_on_polygon(*locate_on_polygon(points, Polygon(vertices))))
+
+class PointHashTest(unittest.TestCase):
+    # Every point closer than epsilon and no other, also across the borders of the cells
+    def test_against_all_points(self):
+        rng = np.random.default_rng(13)
+        points = rng.uniform(0, 0.05, (400, 2))
+        queries = np.concatenate((rng.uniform(0, 0.05, (200, 2)), points[:50] + 0.0009))
+        points_hash = PointHash(points.tolist(), epsilon=0.002)
+        self.assertEqual(len(points_hash), len(points))
+        for query in queries.tolist():
+            expected = np.flatnonzero(np.hypot(*(points - query).T) < 0.002).tolist()
+            self.assertEqual(sorted(points_hash.find(query)), expected)
+            self.assertEqual(points_hash.near(query), bool(expected))
+        np.testing.assert_array_equal(points_hash.mask(queries), [bool(points_hash.find(query)) for query in queries.tolist()])
+
+    def test_dedupe_points(self):
+        self.assertEqual(dedupe_points([(0, 0), (0.5, 0), (2, 0), (0.9, 0.1), (2.5, 0)], 1.0), [(0, 0), (2, 0)])
+
+class TopologyTest(unittest.TestCase):
+    # A ray through a vertex goes on past it when both edges of the vertex are on the same side of the ray
+    def test_expands(self):
+        rng = np.random.default_rng(14)
+        vertices = random_polygon(100, rng)
+        polygon = Polygon(vertices)
+        topology = PolygonTopology(polygon)
+        self.assertEqual(len(topology.vertices), len(vertices))
+        for index, vertex in enumerate(vertices.tolist()):
+            found = topology.vertex_of(vertex)
+            np.testing.assert_array_equal(topology.vertices[found], vertex)
+            self.assertEqual((topology.outgoing[found], topology.incoming[found]), (index, (index - 1) % len(vertices)))
+        self.assertIsNone(topology.vertex_of((-1e9, -1e9)))
+        for center in inside_points(vertices, 5, rng).tolist():
+            for index, (x, y) in enumerate(vertices.tolist()):
+                following = vertices[(index + 1) % len(vertices)]
+                previous = vertices[index - 1]
+                side = orient2d(center[0], center[1], x, y, *following)
+                expected = side != 0 and side == orient2d(center[0], center[1], x, y, *previous)
+                self.assertEqual(topology.expands(center, topology.vertex_of((x, y))), expected)
+
+class DedupeRingTest(unittest.TestCase):
+    # A viewpoint next to the boundary sees two parts of it pass within a pixel of each other
+    def test_only_neighbours(self):
+        ring = [(0, 0), (10, 0), (10, 0.5), (0.6, 0.4), (0, 10)]
+        self.assertEqual(dedupe_ring(ring, 1.0), [(0, 0), (10, 0), (0.6, 0.4), (0, 10)])
+        # The ring is closed, the last points are compared with the first one
+        self.assertEqual(dedupe_ring([(0, 0), (5, 0), (5, 5), (0.3, 0.2), (0.1, 0.1)], 1.0), [(0, 0), (5, 0), (5, 5)])
+
+if __name__ == '__main__':
+    unittest.main()
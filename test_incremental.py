@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+# My own defined modules
+from geometry import Polygon, segment_crossings, split_polygon, sweep_visibility
+from incremental import IncrementalVisibility
+from benchmark import generators, inside_points, drag_path
+
+# The incremental result has to be the one of a full sweep after every move, the first vertex can differ
+def assert_same_ring(test, found, expected):
+    found = np.array(found, dtype=np.float64).reshape(-1, 2)
+    expected = np.array(expected, dtype=np.float64).reshape(-1, 2)
+    test.assertEqual(found.shape, expected.shape)
+    if len(found):
+        expected = np.roll(expected, -int(np.argmin(np.hypot(*(expected - found[0]).T))), axis=0)
+    np.testing.assert_allclose(found, expected, atol=1e-6)
+
+class IncrementalTest(unittest.TestCase):
+    # Small and large steps, repairing everything, the default and falling back almost at once
+    def test_against_sweep_while_dragging(self):
+        for shape, generator in sorted(generators.items()):
+            for step in (5, 1, 0.1, 0.01):
+                rng = np.random.default_rng(5)
+                vertices = generator(300, rng)
+                polygon = Polygon(vertices)
+                split = split_polygon(polygon, segment_crossings(polygon))
+                path = drag_path(vertices, inside_points(vertices, 1, rng)[0], step, 12, rng)
+                for repair_limit in (0.05, 0.6, 5):
+                    incremental = IncrementalVisibility(vertices, repair_limit=repair_limit)
+                    for center in path:
+                        with self.subTest(shape=shape, step=step, repair_limit=repair_limit):
+                            assert_same_ring(self, incremental.update(center), sweep_visibility(center, split))
+
+    # The viewpoint slides along the line of the vertical edges of a comb tooth, they are colinear with it
+    def test_colinear_edges(self):
+        vertices = generators["comb"](20, None)
+        x = float(vertices[2, 0])
+        incremental = IncrementalVisibility(vertices)
+        for y in np.linspace(2, 8, 13):
+            assert_same_ring(self, incremental.update((x, y)), sweep_visibility((x, y), Polygon(vertices)))
+
+if __name__ == '__main__':
+    unittest.main()
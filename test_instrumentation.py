@@ -0,0 +1,64 @@
+import time
+import unittest
+import numpy as np
+# My own defined modules
+from instrumentation import PipelineStats, stats
+from geometry import visibility_polygon
+from benchmark import random_polygon, inside_points
+
+class PipelineStatsTest(unittest.TestCase):
+    def test_switched_off(self):
+        recorder = PipelineStats()
+        with recorder.stage("sweep"):
+            pass
+        recorder.count("rays")
+        snapshot = recorder.snapshot()
+        self.assertEqual((snapshot["enabled"], snapshot["stages"], snapshot["counters"]), (False, {}, {}))
+
+    def test_stages_and_counters(self):
+        recorder = PipelineStats()
+        recorder.enable()
+        for pause in (0.01, 0.03):
+            with recorder.stage("sweep"):
+                time.sleep(pause)
+        recorder.count("rays")
+        recorder.count("rays", 4)
+        stage = recorder.snapshot()["stages"]["sweep"]
+        self.assertEqual(stage["calls"], 2)
+        self.assertGreaterEqual(stage["seconds"], 0.04)
+        self.assertGreaterEqual(stage["max_seconds"], 0.03)
+        self.assertAlmostEqual(stage["mean_seconds"], stage["seconds"] / 2)
+        self.assertEqual(recorder.snapshot()["counters"], {"rays": 5})
+        recorder.reset()
+        self.assertEqual(recorder.snapshot()["stages"], {})
+
+    def test_dump(self):
+        recorder = PipelineStats()
+        recorder.enable()
+        recorder.count("rays")
+        dumps = []
+        recorder.start_dump(0.01, dumps.append, reset=True)
+        while len(dumps) < 3:
+            time.sleep(0.01)
+        recorder.stop_dump()
+        self.assertGreater(len(dumps), 1)
+        self.assertEqual(dumps[0]["counters"], {"rays": 1})
+        self.assertEqual(dumps[-1]["counters"], {})
+
+    # The pipeline reports its stages in the shared stats object
+    def test_pipeline_stages(self):
+        rng = np.random.default_rng(15)
+        vertices = random_polygon(100, rng)
+        stats.reset()
+        stats.enable()
+        try:
+            visibility_polygon(vertices, inside_points(vertices, 1, rng)[0])
+            stages = stats.snapshot()["stages"]
+        finally:
+            stats.disable()
+            stats.reset()
+        for name in ("segment_crossings", "split_polygon", "sweep_visibility"):
+            self.assertEqual(stages[name]["calls"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
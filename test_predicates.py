@@ -0,0 +1,40 @@
+import unittest
+from fractions import Fraction
+import numpy as np
+# My own defined modules
+from predicates import orient2d, orient2d_array, on_segment
+
+# Sign of the orientation determinant evaluated with exact rationals
+def exact_orientation(ax, ay, bx, by, cx, cy):
+    ax, ay, bx, by, cx, cy = (Fraction(value) for value in (ax, ay, bx, by, cx, cy))
+    determinant = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    return (determinant > 0) - (determinant < 0)
+
+# Points c close to the line through a and b, a few ulps off or rounded onto it
+def near_colinear(rng, count):
+    a = rng.uniform(-1000, 1000, (count, 2))
+    b = rng.uniform(-1000, 1000, (count, 2))
+    c = a + rng.uniform(-2, 3, (count, 1)) * (b - a)
+    c = c + rng.integers(-2, 3, (count, 2)) * np.spacing(c)
+    return a, b, c
+
+class OrientationTest(unittest.TestCase):
+    def test_against_fractions(self):
+        rng = np.random.default_rng(4)
+        a, b, c = near_colinear(rng, 3000)
+        expected = [exact_orientation(*a[i], *b[i], *c[i]) for i in range(len(a))]
+        self.assertEqual([orient2d(*a[i], *b[i], *c[i]) for i in range(len(a))], expected)
+        self.assertEqual(orient2d_array(a, b, c).tolist(), expected)
+        # The float determinant alone gets some of these wrong, so the exact path is exercised
+        left = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+        self.assertNotEqual(np.sign(left).astype(int).tolist(), expected)
+
+    def test_exactly_colinear(self):
+        self.assertEqual(orient2d(0.1, 0.1, 0.3, 0.3, 0.7, 0.7), 0)
+        self.assertEqual(orient2d(0, 0, 1, 1, 0.5, 0.5 + 2 ** -53), 1)
+        self.assertTrue(on_segment(0.5, 0.5, 0, 0, 1, 1))
+        self.assertFalse(on_segment(0, 0, 0, 0, 1, 1, open=True))
+        self.assertFalse(on_segment(2, 2, 0, 0, 1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
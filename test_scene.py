@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+# My own defined modules
+from geometry import sweep_visibility, batch_segment_intersections
+from scene import Scene
+from instrumentation import stats
+
+# A room of 100 x 100 with a grid of small square pillars
+def pillar_scene(bins = 1024):
+    boundary = [(0, 0), (100, 0), (100, 100), (0, 100)]
+    obstacles = [[(x, y), (x + 3, y), (x + 3, y + 3), (x, y + 3)] for x in range(8, 92, 7) for y in range(8, 92, 7)]
+    return Scene(boundary, obstacles, bins)
+
+def free_points(scene, count, rng):
+    points = rng.uniform(1, 99, (4 * count, 2))
+    return np.array([point for point in points if scene.contains(point)][:count])
+
+# Distance to the first of the edges along every direction
+def ray_distances(origin, directions, edges):
+    rays = np.column_stack((np.tile(origin, (len(directions), 1)), origin + 500 * directions))
+    mask, points = batch_segment_intersections(rays, edges)
+    distances = np.einsum('ijk,ik->ij', points - origin, directions)
+    distances[~mask] = np.inf
+    return distances.min(axis=1)
+
+class SceneTest(unittest.TestCase):
+    def test_contains(self):
+        scene = pillar_scene()
+        self.assertEqual(len(scene), 144)
+        self.assertTrue(scene.contains((4, 4)))
+        self.assertFalse(scene.contains((9, 9)))
+        self.assertFalse(scene.contains((101, 50)))
+
+    # Culling the hidden pillars gives the same polygon as sweeping every edge
+    def test_culling(self):
+        scene = pillar_scene()
+        rng = np.random.default_rng(16)
+        stats.reset()
+        stats.enable()
+        try:
+            for viewpoint in free_points(scene, 10, rng):
+                expected = np.array(sweep_visibility(viewpoint, scene.split)).reshape(-1, 2)
+                np.testing.assert_allclose(scene.visibility(viewpoint), expected)
+            culled = stats.snapshot()["counters"].get("obstacles culled", 0)
+        finally:
+            stats.disable()
+            stats.reset()
+        self.assertGreater(culled, 0)
+
+    # With max_distance nothing is seen beyond the square around the viewpoint
+    def test_max_distance(self):
+        scene = pillar_scene()
+        rng = np.random.default_rng(17)
+        angles = rng.uniform(-np.pi, np.pi, 300)
+        directions = np.column_stack((np.cos(angles), np.sin(angles)))
+        for viewpoint in free_points(scene, 5, rng):
+            visible = scene.visibility(viewpoint, 12)
+            ring = np.concatenate((visible, np.roll(visible, -1, axis=0)), axis=1)
+            # Distance to the square of half size 12 along every direction
+            square = 12 / np.max(np.abs(directions), axis=1)
+            expected = np.minimum(ray_distances(viewpoint, directions, scene.split.segments), square)
+            np.testing.assert_allclose(ray_distances(viewpoint, directions, ring), expected, rtol=1e-6, atol=1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+# My own defined modules
+from geometry import Polygon, EdgeGrid, segment_crossings, split_polygon, sweep_visibility
+from scenefile import save_scene, load_scene, write_sections
+from benchmark import scribble_polygon, inside_points
+
+class SceneFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        rng = np.random.default_rng(10)
+        self.vertices = scribble_polygon(300, rng)
+        self.polygon = Polygon(self.vertices)
+        self.split = split_polygon(self.polygon, segment_crossings(self.polygon))
+        self.viewpoints = inside_points(self.vertices, 5, rng)
+        self.results = [np.array(sweep_visibility(viewpoint, self.split)).reshape(-1, 2) for viewpoint in self.viewpoints]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    # Everything written comes back the same, as read only views on the file
+    def test_round_trip(self):
+        path = os.path.join(self.directory, "scene.vis")
+        save_scene(path, self.polygon, (self.viewpoints, self.results))
+        scene = load_scene(path)
+        self.assertEqual(len(scene), len(self.polygon))
+        np.testing.assert_array_equal(scene.polygon.vertices, self.polygon.vertices)
+        np.testing.assert_array_equal(scene.polygon.edges, self.polygon.edges)
+        self.assertEqual(scene.crossings, segment_crossings(self.polygon))
+        np.testing.assert_array_equal(scene.segments, self.split.segments)
+        np.testing.assert_array_equal(scene.sections["split_origins"], self.split.origins)
+        self.assertFalse(scene.segments.flags.writeable)
+        self.assertEqual(scene.result_count(), len(self.results))
+        for index, (viewpoint, points) in enumerate(zip(self.viewpoints, self.results)):
+            stored_viewpoint, stored_points = scene.result(index)
+            np.testing.assert_array_equal(stored_viewpoint, viewpoint)
+            np.testing.assert_array_equal(stored_points, points)
+
+    # The stored grid is the grid built from the segments
+    def test_edge_index(self):
+        path = os.path.join(self.directory, "scene.vis")
+        save_scene(path, self.vertices)
+        stored = load_scene(path).edge_index
+        built = EdgeGrid(self.split)
+        np.testing.assert_array_equal(stored.origin, built.origin)
+        self.assertEqual((stored.cell_size, stored.shape), (built.cell_size, built.shape))
+        self.assertEqual(sorted(stored.cells), sorted(built.cells))
+        for cell, indices in built.cells.items():
+            np.testing.assert_array_equal(stored.cells[cell], indices)
+        for viewpoint in self.viewpoints:
+            for angle in np.linspace(-np.pi, np.pi, 16, endpoint=False):
+                direction = (np.cos(angle), np.sin(angle))
+                self.assertEqual(stored.first_hit(viewpoint, direction), built.first_hit(viewpoint, direction))
+
+    # Without the precomputed sections the scene computes them on first use
+    def test_without_precompute(self):
+        path = os.path.join(self.directory, "scene.vis")
+        save_scene(path, self.vertices, precompute=False)
+        scene = load_scene(path)
+        self.assertNotIn("split_segments", scene)
+        np.testing.assert_array_equal(scene.segments, self.split.segments)
+        self.assertEqual(scene.result_count(), 0)
+        self.assertEqual(sorted(scene.edge_index.cells), sorted(EdgeGrid(self.split).cells))
+
+    def test_not_a_scene(self):
+        path = os.path.join(self.directory, "other.vis")
+        with open(path, "wb") as file:
+            file.write(b"\0" * 256)
+        with self.assertRaises(ValueError):
+            load_scene(path)
+        with self.assertRaises(ValueError):
+            write_sections(path, {"three": np.zeros((1, 1, 1))})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import unittest
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+import pygame.gfxdraw
+# My own defined modules
+from sprites import Pulse, pulse_schedule, Circle, VisibilityPolygon, RubberBandLine
+
+# The alpha of every frame as the sprites computed it before the schedules, one step and a bounce at the limits
+def stepped_alphas(start, step, low, high, frames):
+    alphas = []
+    alpha = start
+    increase_alpha = True
+    for _ in range(frames):
+        alpha = alpha + step if increase_alpha else alpha - step
+        if alpha >= high:
+            increase_alpha = False
+            alpha = high
+        elif alpha <= low:
+            increase_alpha = True
+            alpha = low
+        alphas.append(alpha)
+    return alphas
+
+class PulseTest(unittest.TestCase):
+    def test_against_stepping(self):
+        for parameters in ((0, 4, 50, 255), (100, 10, 50, 255), (100, 10, 80, 255), (7, 3, 7, 8)):
+            pulse = Pulse(*parameters)
+            self.assertEqual([pulse.next() for _ in range(500)], stepped_alphas(*parameters, 500))
+
+    def test_shared(self):
+        self.assertIs(pulse_schedule(0, 4, 50, 255), pulse_schedule(0, 4, 50, 255))
+
+class SpriteTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        pygame.init()
+        pygame.display.set_mode((200, 200))
+
+    @classmethod
+    def tearDownClass(cls):
+        pygame.quit()
+
+    # The sprites pulse through the alpha of their surface
+    def test_pulse_through_surface_alpha(self):
+        circle = Circle((50, 50), 10)
+        area = VisibilityPolygon((100, 100), [(20, 20), (180, 20), (180, 180), (20, 180)])
+        expected = stepped_alphas(100, 10, 80, 255, 30)
+        found = []
+        for _ in range(30):
+            circle.update()
+            found.append(circle.image.get_alpha())
+        self.assertEqual(found, expected)
+        area.update()
+        self.assertEqual(area.image.get_alpha(), 110)
+
+    # The rays stay visible on the area
+    def test_visibility_polygon_colors(self):
+        area = VisibilityPolygon((100, 100), [(20, 20), (180, 20), (180, 180), (20, 180)], animated=False)
+        screen = pygame.surface.Surface((200, 200))
+        screen.fill((255, 255, 255))
+        screen.blit(area.image, area.rect)
+        self.assertEqual(tuple(screen.get_at((60, 30)))[:3], (0, 0, 0))
+        self.assertEqual(tuple(screen.get_at((60, 60)))[:3], tuple(pygame.color.Color("gray60"))[:3])
+        self.assertEqual(tuple(screen.get_at((5, 5)))[:3], (255, 255, 255))
+
+    # A shorter line leaves nothing of the longer one behind in the pool
+    def test_rubber_band(self):
+        line = RubberBandLine((10, 10), (150, 150))
+        pool = line.pool
+        line.set_position((10, 10), (20, 100))
+        self.assertIs(line.pool, pool)
+        screen = pygame.surface.Surface((200, 200))
+        screen.fill((255, 255, 255))
+        screen.blit(line.image, line.rect)
+        dark = [(x, y) for x in range(200) for y in range(200) if screen.get_at((x, y))[0] < 128]
+        self.assertTrue(dark)
+        self.assertTrue(all(x <= 21 and y <= 101 for x, y in dark))
+
+if __name__ == '__main__':
+    unittest.main()
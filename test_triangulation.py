@@ -0,0 +1,36 @@
+import unittest
+import numpy as np
+# My own defined modules
+from geometry import Polygon, sweep_visibility
+from triangulation import TriangulatedPolygon
+from benchmark import generators, inside_points
+
+def area(points):
+    points = np.array(points, dtype=np.float64).reshape(-1, 2)
+    x, y = points[:, 0], points[:, 1]
+    return 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+class TriangulationTest(unittest.TestCase):
+    # Triangular expansion drops colinear vertices, so the regions are compared and not the vertex lists
+    def test_area_against_sweep(self):
+        rng = np.random.default_rng(6)
+        for shape in ("random", "star", "comb", "spiral"):
+            vertices = generators[shape](400, rng)
+            triangulated = TriangulatedPolygon(vertices)
+            self.assertEqual(len(triangulated.triangles), len(triangulated.vertices) - 2)
+            # The triangles cover the polygon, counterclockwise and without overlaps
+            triangles = triangulated.vertices[triangulated.triangles]
+            triangle_areas = [area(triangle) for triangle in triangles]
+            self.assertGreater(min(triangle_areas), 0)
+            self.assertAlmostEqual(sum(triangle_areas), abs(area(vertices)), delta=1e-9 * abs(area(vertices)))
+            for viewpoint in inside_points(vertices, 5, rng):
+                with self.subTest(shape=shape, viewpoint=viewpoint.tolist()):
+                    expected = area(sweep_visibility(viewpoint, Polygon(vertices)))
+                    self.assertAlmostEqual(area(triangulated.visibility(viewpoint)), expected, delta=1e-6 * abs(expected))
+
+    def test_self_intersecting(self):
+        with self.assertRaises(ValueError):
+            TriangulatedPolygon(np.array([(0, 0), (10, 10), (10, 0), (0, 10)], dtype=np.float64))
+
+if __name__ == '__main__':
+    unittest.main()
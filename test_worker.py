@@ -0,0 +1,62 @@
+import time
+import unittest
+import numpy as np
+# My own defined modules
+from geometry import visibility_polygon, iter_visibility_polygon, segment_crossings, split_polygon, Polygon
+from worker import VisibilityJob, Cancelled
+from benchmark import random_polygon, spiral_polygon, scribble_polygon, inside_points
+
+class StreamingTest(unittest.TestCase):
+    # The streamed vertices are the ones visibility_polygon returns, in the same order
+    def test_same_as_visibility_polygon(self):
+        rng = np.random.default_rng(18)
+        for generator in (random_polygon, spiral_polygon, scribble_polygon):
+            vertices = generator(300, rng)
+            for viewpoint in inside_points(vertices, 3, rng):
+                streamed = np.array(list(iter_visibility_polygon(vertices, viewpoint))).reshape(-1, 2)
+                np.testing.assert_array_equal(streamed, visibility_polygon(vertices, viewpoint))
+
+class CancelledCheck(Exception):
+    pass
+
+class VisibilityJobTest(unittest.TestCase):
+    def test_result_and_partial(self):
+        vertices = spiral_polygon(4000, np.random.default_rng(19))
+        viewpoint = (vertices[0] + vertices[-1]) / 2
+        job = VisibilityJob(vertices, viewpoint)
+        seen = []
+        while not job.done():
+            seen.append(job.partial())
+            time.sleep(0.001)
+        result = job.result()
+        np.testing.assert_array_equal(result, visibility_polygon(vertices, viewpoint))
+        # Every partial result is the start of the final one
+        for partial in seen:
+            np.testing.assert_array_equal(np.array(partial).reshape(-1, 2), result[:len(partial)])
+
+    def test_cancel(self):
+        vertices = spiral_polygon(20000, np.random.default_rng(20))
+        job = VisibilityJob(vertices, (vertices[0] + vertices[-1]) / 2)
+        time.sleep(0.05)
+        job.cancel()
+        with self.assertRaises(Cancelled):
+            job.result()
+
+    # The crossing stages call the check, raising in it stops them before the sweep
+    def test_check_in_crossing_stages(self):
+        polygon = Polygon(scribble_polygon(20000, np.random.default_rng(21)))
+        calls = []
+
+        def check():
+            calls.append(None)
+            if len(calls) > 3:
+                raise CancelledCheck()
+
+        with self.assertRaises(CancelledCheck):
+            segment_crossings(polygon, check)
+        calls.clear()
+        with self.assertRaises(CancelledCheck):
+            split_polygon(polygon, segment_crossings(polygon), check)
+
+if __name__ == '__main__':
+    unittest.main()
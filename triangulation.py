@@ -0,0 +1,234 @@
+import time
+from collections import deque
+import numpy as np
+# My own defined modules
+from geometry import Point, Polygon, segment_crossings
+
+# Twice the signed area of the triangle, positive when a b c turn counterclockwise
+def _cross(ax, ay, bx, by, cx, cy):
+    return (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+
+# Drops repeated and colinear vertices, they don't change the region but break ear clipping
+def _clean_ring(vertices):
+    points = [tuple(vertex) for vertex in vertices.tolist()]
+    changed = True
+    while changed and len(points) > 3:
+        changed = False
+        kept = []
+        length = len(points)
+        for index in range(length):
+            previous = kept[-1] if kept else points[index - 1]
+            current = points[index]
+            following = points[(index + 1) % length]
+            if current == previous or _cross(previous[0], previous[1], current[0], current[1], following[0], following[1]) == 0:
+                changed = True
+                continue
+            kept.append(current)
+        points = kept
+    return np.array(points, dtype=np.float64).reshape(-1, 2)
+
+# Ear clipping of a simple counterclockwise polygon, the reflex vertices sit in a grid so an ear
+# test only looks at the reflex vertices near the ear instead of all of them
+def ear_clipping(vertices):
+    length = len(vertices)
+    xs = vertices[:, 0].tolist()
+    ys = vertices[:, 1].tolist()
+    previous = [(index - 1) % length for index in range(length)]
+    following = [(index + 1) % length for index in range(length)]
+    lower = vertices.min(axis=0)
+    cell_size = max(float(np.max(vertices.max(axis=0) - lower)) / max(np.sqrt(length), 1), 1e-12)
+    origin_x, origin_y = float(lower[0]), float(lower[1])
+
+    def cell(index):
+        return (int((xs[index] - origin_x) // cell_size), int((ys[index] - origin_y) // cell_size))
+
+    def convex(index):
+        p, n = previous[index], following[index]
+        return _cross(xs[p], ys[p], xs[index], ys[index], xs[n], ys[n]) > 0
+
+    reflex = {}
+    for index in range(length):
+        if not convex(index):
+            reflex.setdefault(cell(index), set()).add(index)
+
+    def ear(index):
+        if not convex(index):
+            return False
+        p, n = previous[index], following[index]
+        ax, ay, bx, by, cx, cy = xs[p], ys[p], xs[index], ys[index], xs[n], ys[n]
+        first_x, first_y = int((min(ax, bx, cx) - origin_x) // cell_size), int((min(ay, by, cy) - origin_y) // cell_size)
+        last_x, last_y = int((max(ax, bx, cx) - origin_x) // cell_size), int((max(ay, by, cy) - origin_y) // cell_size)
+        for cell_x in range(first_x, last_x + 1):
+            for cell_y in range(first_y, last_y + 1):
+                for other in reflex.get((cell_x, cell_y), ()):
+                    if other == p or other == n or other == index:
+                        continue
+                    x, y = xs[other], ys[other]
+                    if _cross(ax, ay, bx, by, x, y) >= 0 and _cross(bx, by, cx, cy, x, y) >= 0 and _cross(cx, cy, ax, ay, x, y) >= 0:
+                        return False
+        return True
+
+    triangles = []
+    alive = [True] * length
+    remaining = length
+    queue = deque(range(length))
+    while remaining > 3:
+        if queue:
+            index = queue.popleft()
+            if not alive[index] or not ear(index):
+                continue
+        else:
+            # Only numerical trouble gets here, clip any convex vertex to finish
+            index = next((index for index in range(length) if alive[index] and convex(index)), None)
+            if index is None:
+                index = next(index for index in range(length) if alive[index])
+        p, n = previous[index], following[index]
+        triangles.append((p, index, n))
+        alive[index] = False
+        remaining = remaining - 1
+        following[p] = n
+        previous[n] = p
+        for neighbour in (p, n):
+            bucket = reflex.get(cell(neighbour))
+            if bucket and neighbour in bucket and convex(neighbour):
+                bucket.discard(neighbour)
+            queue.append(neighbour)
+    last = next(index for index in range(length) if alive[index])
+    triangles.append((previous[last], last, following[last]))
+    return np.array(triangles, dtype=np.int32)
+
+# Preprocessed query structure for many visibility queries against one simple polygon
+# The polygon is triangulated once, queries locate the triangle of the point through a grid and expand the
+# view cone from it triangle by triangle (triangular expansion), only the triangles that are seen get visited
+# build_seconds and nbytes tell what the preprocessing cost, to compare it against sweep_visibility
+class TriangulatedPolygon:
+    def __init__(self, vertices):
+        started = time.perf_counter()
+        polygon = vertices if isinstance(vertices, Polygon) else Polygon(vertices)
+        if segment_crossings(polygon):
+            raise ValueError("Triangular expansion needs a simple polygon, this one intersects itself")
+        vertices = _clean_ring(polygon.vertices)
+        if len(vertices) < 3:
+            raise ValueError("The polygon needs at least three vertices that are not colinear")
+        x, y = vertices[:, 0], vertices[:, 1]
+        if np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)) < 0:
+            vertices = vertices[::-1].copy()
+        self.vertices = vertices
+        self.triangles = ear_clipping(vertices)
+
+        # neighbours[t, k] is the triangle across the edge from corner k to corner k + 1, -1 on the boundary
+        self.neighbours = np.full(self.triangles.shape, -1, dtype=np.int32)
+        edges = {}
+        for triangle, corners in enumerate(self.triangles.tolist()):
+            for k in range(3):
+                edges[(corners[k], corners[(k + 1) % 3])] = (triangle, k)
+        for (start, end), (triangle, k) in edges.items():
+            other = edges.get((end, start))
+            if other:
+                self.neighbours[triangle, k] = other[0]
+
+        # Grid over the bounding boxes of the triangles for point location, stored as CSR arrays
+        corners = vertices[self.triangles]
+        lower = corners.min(axis=1)
+        upper = corners.max(axis=1)
+        self.origin = vertices.min(axis=0)
+        extent = np.maximum(vertices.max(axis=0) - self.origin, 1e-12)
+        self.cell_size = float(np.max(extent)) / max(np.sqrt(len(self.triangles)), 1)
+        self.shape = (int(extent[0] // self.cell_size) + 1, int(extent[1] // self.cell_size) + 1)
+        first = ((lower - self.origin) // self.cell_size).astype(np.intp)
+        last = ((upper - self.origin) // self.cell_size).astype(np.intp)
+        buckets = [[] for _ in range(self.shape[0] * self.shape[1])]
+        for triangle, ((first_x, first_y), (last_x, last_y)) in enumerate(zip(first.tolist(), last.tolist())):
+            for cell_x in range(first_x, last_x + 1):
+                for cell_y in range(first_y, last_y + 1):
+                    buckets[cell_x * self.shape[1] + cell_y].append(triangle)
+        self.cell_starts = np.cumsum([0] + [len(bucket) for bucket in buckets]).astype(np.int32)
+        self.cell_triangles = np.array([triangle for bucket in buckets for triangle in bucket], dtype=np.int32)
+
+        self._xs = vertices[:, 0].tolist()
+        self._ys = vertices[:, 1].tolist()
+        self._triangles = self.triangles.tolist()
+        self._neighbours = self.neighbours.tolist()
+        self.build_seconds = time.perf_counter() - started
+        self.nbytes = sum(array.nbytes for array in (self.vertices, self.triangles, self.neighbours, self.cell_starts, self.cell_triangles))
+
+    def build_report(self):
+        return {"vertices": len(self.vertices), "triangles": len(self.triangles), "seconds": self.build_seconds, "bytes": self.nbytes}
+
+    # Index of the triangle holding the point, None outside of the polygon
+    def locate(self, point):
+        x, y = float(point[0]), float(point[1])
+        cell_x = int((x - self.origin[0]) // self.cell_size)
+        cell_y = int((y - self.origin[1]) // self.cell_size)
+        if cell_x < 0 or cell_y < 0 or cell_x >= self.shape[0] or cell_y >= self.shape[1]:
+            return None
+        cell = cell_x * self.shape[1] + cell_y
+        xs, ys = self._xs, self._ys
+        for triangle in self.cell_triangles[self.cell_starts[cell]:self.cell_starts[cell + 1]].tolist():
+            a, b, c = self._triangles[triangle]
+            if _cross(xs[a], ys[a], xs[b], ys[b], x, y) >= 0 and _cross(xs[b], ys[b], xs[c], ys[c], x, y) >= 0 and \
+                _cross(xs[c], ys[c], xs[a], ys[a], x, y) >= 0:
+                return triangle
+        return None
+
+    # Vertices of the visibility polygon from the point, counterclockwise like sweep_visibility
+    # Only the region matches the sweep, colinear polygon vertices are gone after _clean_ring so where
+    # sweep_visibility passes through one of them this returns fewer vertices
+    def visibility(self, point):
+        triangle = self.locate(point)
+        if triangle is None:
+            return []
+        qx, qy = float(point[0]), float(point[1])
+        xs, ys = self._xs, self._ys
+        triangles, neighbours = self._triangles, self._neighbours
+        list = []
+
+        def emit(x, y):
+            if not list or abs(list[-1].x - x) >= 0.001 or abs(list[-1].y - y) >= 0.001:
+                list.append(Point(x, y))
+
+        # Where the ray from the point through (rx, ry) meets the line of the edge a b
+        def hit(rx, ry, a, b):
+            dx, dy = rx - qx, ry - qy
+            sx, sy = xs[b] - xs[a], ys[b] - ys[a]
+            denominator = dx * sy - dy * sx
+            if denominator == 0:
+                return xs[a], ys[a]
+            t = ((xs[a] - qx) * sy - (ys[a] - qy) * sx) / denominator
+            return qx + t * dx, qy + t * dy
+
+        # Every entry crosses the edge a b of the triangle, seen from the point a is on the right,
+        # the view cone goes counterclockwise from the ray through right to the ray through left
+        stack = []
+        corners = triangles[triangle]
+        for k in (2, 1, 0):
+            a, b = corners[k], corners[(k + 1) % 3]
+            stack.append((neighbours[triangle][k], a, b, (xs[a], ys[a]), (xs[b], ys[b])))
+        while stack:
+            triangle, a, b, right, left = stack.pop()
+            if triangle < 0:
+                # A boundary edge, the part inside the cone is visible
+                emit(*hit(right[0], right[1], a, b))
+                emit(*hit(left[0], left[1], a, b))
+                continue
+            corners = triangles[triangle]
+            k = corners.index(b)
+            # The entry edge is b a in this triangle, w is the corner beyond it
+            w = corners[(k + 2) % 3]
+            first_neighbour = neighbours[triangle][(k + 1) % 3]
+            second_neighbour = neighbours[triangle][(k + 2) % 3]
+            wx, wy = xs[w], ys[w]
+            after_right = _cross(qx, qy, right[0], right[1], wx, wy) > 0
+            before_left = _cross(qx, qy, left[0], left[1], wx, wy) < 0
+            if after_right and before_left:
+                # w splits the cone, push the left part first so the right part comes out first
+                stack.append((second_neighbour, w, b, (wx, wy), left))
+                stack.append((first_neighbour, a, w, right, (wx, wy)))
+            elif not after_right:
+                stack.append((second_neighbour, w, b, right, left))
+            else:
+                stack.append((first_neighbour, a, w, right, left))
+
+        if len(list) > 1 and abs(list[0].x - list[-1].x) < 0.001 and abs(list[0].y - list[-1].y) < 0.001:
+            list.pop()
+        return list
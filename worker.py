@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+# My own defined modules
+from geometry import iter_visibility_polygon
+from instrumentation import stats
+
+# Visibility polygons computed away from the render loop
+# The window submits a job, keeps drawing and polls it every frame:
+#   job = VisibilityJob(vertices, viewpoint)
+#   job.partial()   the vertices found so far, ordered by angle
+#   job.done()      the result is ready, job.result() gives it as a (K, 2) array
+#   job.cancel()    stops the computation at its next check
+# The job runs on a thread so the partial vertices are shared without copying them between processes,
+# the pure Python parts of the sweep give the GIL back every switch interval so the loop keeps its frame rate
+
+# Raised inside of a cancelled job, result() raises it again
+class Cancelled(Exception):
+    pass
+
+# One worker is enough, the window only waits for one visibility polygon at a time
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="visibility")
+
+class VisibilityJob:
+    def __init__(self, vertices, viewpoint):
+        self.vertices = vertices
+        self.viewpoint = viewpoint
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        self.points = []
+        self.future = executor.submit(self._run)
+
+    def _run(self):
+        with stats.stage("visibility_polygon"):
+            for point in iter_visibility_polygon(self.vertices, self.viewpoint, self._check):
+                self._check()
+                with self.lock:
+                    self.points.append(point)
+        return np.array(self.points, dtype=np.float64).reshape(-1, 2)
+
+    def _check(self):
+        if self.cancelled.is_set():
+            raise Cancelled()
+
+    # Copy of the vertices found so far
+    def partial(self):
+        with self.lock:
+            return list(self.points)
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.future.cancel()